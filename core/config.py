@@ -1,5 +1,5 @@
+import functools
 import os
-import time
 from pathlib import Path
 
 
@@ -18,6 +18,35 @@ class Config:
         self.max_context = 2048  # Maximum context length for the model.
         self.infer_predictor_path = f"{config_path}/kronos/model/weight/predictor"
         self.infer_tokenizer_path = f"{config_path}/kronos/model/weight/tokenizer"
+        self.attn_backend = "sdpa"  # Attention implementation: "sdpa" or "math".
+        self.infer_precision = "fp32"  # "fp32", "bf16" or "int8-dynamic".
+        self.infer_memory_budget_mb = (
+            2048  # Estimated memory per micro-batch, None: unlimited.
+        )
+        self.infer_latency_budget_s = (
+            None  # Target seconds per micro-batch, None: unlimited.
+        )
+        self.infer_workers = 1  # Micro-batches run in parallel.
+        self.infer_use_server = False  # Predict through the local inference daemon.
+        self.infer_server_path = "/tmp/kronos-infer.sock"  # Unix socket of the daemon.
+        self.infer_batch_window_ms = 10  # Daemon waits this long to coalesce requests.
+        self.infer_mmap_weights = True  # Memory-map the safetensors weights.
+        self.infer_warmup = True  # Run a small warm-up prediction after loading.
+        self.infer_processes = 1  # >1: shard series over processes sharing the weights.
+        self.infer_threads_per_process = (
+            None  # None: available cores / infer_processes.
+        )
+        self.infer_adaptive = False  # Sample in rounds until the decision is clear.
+        self.infer_round_size = 4  # Paths per coin and round in adaptive mode.
+        self.infer_max_samples = 32  # Path limit per coin in adaptive mode.
+        self.infer_confidence = 0.95  # Confidence of the up-probability interval.
+        self.infer_norm_anchor = "window"  # "anchored": warm-start from cached prompts.
+        self.infer_anchor_max_len = 512  # Anchored history length before re-anchoring.
+        self.infer_cache_entries = 256  # Cached seeded predictions, 0: no cache.
+        self.infer_cache_dir = None  # On-disk cache tier, None: memory only.
+        self.infer_cache_disk_mb = 256  # Size limit of the on-disk cache tier.
+        self.short_threshold = 0.4  # Short below this up-probability.
+        self.long_threshold = 0.6  # Long above this up-probability.
 
         # =================================================================
         # 固定配置配置
@@ -27,7 +56,7 @@ class Config:
         self.eadam_beta1 = 0.9
         self.adam_beta2 = 0.95
         self.adam_weight_decay = 0.1
-        self.seed = int(time.time())  # Global random seed for reproducibility.
+        self.seed = 42  # Base sampling seed, mixed with every window's last bar (see window_seeds).
         self.accumulation_steps = 1
 
         self.device = "cpu"
@@ -48,6 +77,13 @@ class Config:
 
         # 实盘: 0, 模拟盘: 1
         self.flag = "1"
+        self.okx_base_url = "https://www.okx.com"  # Candle API host (or a local mock).
+        self.okx_rate_limit = 20  # history-candles requests per 2 seconds.
+        self.okx_max_connections = 8  # Pooled keep-alive connections.
+        # Local candle store, synced incrementally every cycle; None: download everything.
+        self.candle_store_dir = os.path.expanduser("~/.cache/crypto/candles")
+        # Bulk downloads for backtests (core.okx.bulk_download), kept apart from the live stores.
+        self.backtest_store_dir = os.path.expanduser("~/.cache/crypto/backtest")
 
         self.target_coins = [
             "BTC",
@@ -57,3 +93,9 @@ class Config:
             "SOL",
         ]
         self.debug = False
+
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """Shared `Config` instance, so the settings (and ~/.okxrc) are read once per process."""
+    return Config()
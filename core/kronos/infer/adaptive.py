@@ -0,0 +1,116 @@
+from statistics import NormalDist
+
+import numpy as np
+
+from core.kronos.model.kronos import series_seeds
+
+CLOSE = 3  # index of close in the predicted features (open, high, low, close, volume, amount)
+
+
+def wilson_interval(ups, n, confidence=0.95):
+    """Wilson score interval of the up-probability after `ups` rising paths out of `n`."""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = np.maximum(n, 1)
+    p = ups / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return center - half, center + half
+
+
+def adaptive_distribution(
+    runner,
+    df_list,
+    x_timestamp_list,
+    y_timestamp_list,
+    pred_len,
+    thresholds=(0.4, 0.6),
+    round_size=4,
+    max_samples=32,
+    confidence=0.95,
+    series_keys=None,
+    seed=None,
+    **kwargs,
+):
+    """
+    Estimates the up-probability of every series with as few sample paths as its decision needs.
+
+    Paths are sampled in rounds. After each round a series stops as soon as the Wilson interval of
+    its up-probability lies entirely below, between or above `thresholds`, i.e. the short/hold/long
+    decision can no longer flip, or once it has `max_samples` paths. Every round samples the same
+    number of paths, `round_size` per input series: the slots freed by decided series go to the
+    ones still undecided, as a larger per-series sample count (each series is still passed, and its
+    prompt run, only once).
+
+    Args:
+        runner: Object with a `predict_paths` method, a `KronosPredictor` or `MicroBatchScheduler`.
+        thresholds (Tuple[float, float]): Short and long thresholds on the up-probability.
+        round_size (int): Sample paths per series and round.
+        max_samples (int): Maximum sample paths per series.
+        confidence (float): Confidence level of the interval.
+        series_keys (List[Hashable], optional): Keys of the series for the warm-start cache of
+                                                `predict_paths`.
+        seed (int or Sequence[int], optional): Round r samples with the per-series seeds of
+                              `seed + r` (by input index), so every round draws new paths.
+        **kwargs: Passed on to `predict_paths` (T, top_k, top_p).
+
+    Returns:
+        dict: with keys "prob_up", "mean_return", "last_close" as in `predict_distribution`, plus
+              "samples" (num_series,) paths spent on each series and "rounds".
+    """
+    num_series = len(df_list)
+    low, high = thresholds
+    last_close = np.array(
+        [
+            df[-1, CLOSE] if isinstance(df, np.ndarray) else df["close"].iloc[-1]
+            for df in df_list
+        ],
+        dtype=np.float64,
+    )
+    ups = np.zeros(num_series)
+    samples = np.zeros(num_series, dtype=np.int64)
+    close_sum = np.zeros(num_series)
+
+    slots = num_series  # round_size-path slots per round
+    active = np.arange(num_series)
+    rounds = 0
+    while active.size:
+        # spread the round's slots over the undecided series, without exceeding max_samples
+        share = max(1, slots // active.size)
+        left = np.ceil((max_samples - samples[active]) / round_size).astype(np.int64)
+        counts = np.minimum(share, left) * round_size
+
+        if series_keys is not None:
+            kwargs["series_keys"] = [series_keys[i] for i in active]
+        if seed is not None:
+            kwargs["seed"] = series_seeds(seed + rounds, num_series)[active]
+        paths = runner.predict_paths(
+            [df_list[i] for i in active],
+            [x_timestamp_list[i] for i in active],
+            [y_timestamp_list[i] for i in active],
+            pred_len,
+            sample_count=counts,
+            last_step_only=True,
+            **kwargs,
+        )
+        # the paths of every active series in consecutive rows
+        rows = np.repeat(active, counts)
+        final_close = paths[:, -1, CLOSE]  # (counts.sum(),)
+        np.add.at(ups, rows, final_close > last_close[rows])
+        np.add.at(close_sum, rows, final_close)
+        samples[active] += counts
+        rounds += 1
+
+        lower, upper = wilson_interval(ups[active], samples[active], confidence)
+        decided = (upper < low) | (lower > high) | ((lower > low) & (upper < high))
+        active = active[~decided & (samples[active] < max_samples)]
+
+    prob_up = ups / samples
+    mean_close = close_sum / samples
+    return {
+        "prob_up": prob_up,
+        "mean_return": (mean_close - last_close) / last_close,
+        "last_close": last_close,
+        "samples": samples,
+        "rounds": rounds,
+    }
@@ -0,0 +1,254 @@
+import copy
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.kronos.model.kronos import series_seeds
+
+
+def current_rss_bytes():
+    """Resident set size of this process, in bytes (Linux /proc, else the peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, in bytes."""
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def estimate_series_bytes(predictor, seq_len, pred_len, sample_count):
+    """
+    Rough upper bound of the transient memory one series needs during `generate`.
+
+    Counts, per sample path, the key/value caches of the predictor (self- and cross-attention)
+    and of the tokenizer decoder, plus the largest activations of a full-window pass: the
+    [n_heads, L, L] attention scores and the [L, ff_dim] feed-forward hidden state.
+    """
+    model, tokenizer = predictor.model, predictor.tokenizer
+    itemsize = 2 if predictor.precision == "bf16" else 4
+    window = min(seq_len + pred_len, predictor.max_context)
+
+    kv_cache = (
+        2
+        * window
+        * (
+            (model.n_layers + 1) * model.d_model
+            + (tokenizer.dec_layers - 1) * tokenizer.d_model
+        )
+    )
+    scores = max(model.n_heads, tokenizer.n_heads) * window * window
+    ffn = window * max(model.ff_dim, tokenizer.ff_dim)
+    return sample_count * (kv_cache + scores + ffn) * itemsize
+
+
+class MicroBatchScheduler:
+    """
+    Splits a large prediction batch into micro-batches that fit a memory and/or latency budget.
+
+    Series are grouped by history length, so the padding of a ragged watchlist stays small, and
+    results are returned in input order, as if the whole batch had been predicted at once.
+    With `workers > 1` the micro-batches run on a thread pool, each worker on its own copy of
+    the predictor (the attention caches live in the modules) and with an equal share of the
+    memory budget.
+
+    Args:
+        predictor (KronosPredictor): Predictor to run the micro-batches on.
+        memory_budget_mb (float, optional): Estimated transient memory a micro-batch may use
+                                            (see `estimate_series_bytes`). Defaults to None (no limit).
+        latency_budget_s (float, optional): Target wall time of one micro-batch. Sizes are adapted
+                                            to the measured time per series; with a single worker the
+                                            first micro-batch is a one-series probe, with several the
+                                            sizes adapt from the previous call. Defaults to None.
+        workers (int): Number of micro-batches run in parallel. Defaults to 1 (back to back).
+        max_batch_size (int, optional): Hard cap on the series per micro-batch. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        memory_budget_mb=None,
+        latency_budget_s=None,
+        workers=1,
+        max_batch_size=None,
+    ):
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}.")
+        self.predictor = predictor
+        self.memory_budget_mb = memory_budget_mb
+        self.latency_budget_s = latency_budget_s
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.last_report = None
+        self._seconds_per_series = None
+        self._replicas = [predictor] + [
+            copy.deepcopy(predictor) for _ in range(workers - 1)
+        ]
+        for replica in self._replicas:
+            replica.prefix_states = predictor.prefix_states  # one warm-start cache
+
+    def batch_size(self, seq_len, pred_len, sample_count):
+        """Number of series of length `seq_len` that fit into one micro-batch."""
+        size = self.max_batch_size or np.iinfo(np.int64).max
+        if self.memory_budget_mb is not None:
+            budget = self.memory_budget_mb * 2**20 / self.workers
+            per_series = estimate_series_bytes(
+                self.predictor, seq_len, pred_len, sample_count
+            )
+            size = min(size, int(budget // per_series))
+        if self.latency_budget_s is not None:
+            if self._seconds_per_series is None:
+                if self.workers == 1:
+                    size = min(size, 1)
+            else:
+                size = min(size, int(self.latency_budget_s / self._seconds_per_series))
+        return max(1, size)
+
+    def predict_paths(
+        self, df_list, x_timestamp_list, y_timestamp_list, pred_len, **kwargs
+    ):
+        """`KronosPredictor.predict_paths` over micro-batches; the results are concatenated."""
+        results, order = self._run(
+            "predict_paths",
+            df_list,
+            x_timestamp_list,
+            y_timestamp_list,
+            pred_len,
+            kwargs,
+        )
+        paths = np.concatenate(results, axis=0)
+        sample_count = kwargs.get("sample_count", 8)
+        if np.ndim(sample_count):
+            # per-series sample counts: the rows are blocks of paths, regroup them by series
+            counts = np.asarray(sample_count)[np.argsort(order)]
+            blocks = np.split(paths, np.cumsum(counts)[:-1], axis=0)
+            return np.concatenate([blocks[i] for i in order], axis=0)
+        return paths[order]
+
+    def predict_distribution(
+        self, df_list, x_timestamp_list, y_timestamp_list, pred_len, **kwargs
+    ):
+        """`KronosPredictor.predict_distribution` over micro-batches; the results are concatenated."""
+        results, order = self._run(
+            "predict_distribution",
+            df_list,
+            x_timestamp_list,
+            y_timestamp_list,
+            pred_len,
+            kwargs,
+        )
+        merged = {}
+        for key in results[0]:
+            # quantiles are (len(quantiles), num_series, ...), everything else is series first
+            axis = 1 if key == "quantiles" else 0
+            merged[key] = np.take(
+                np.concatenate([r[key] for r in results], axis=axis), order, axis=axis
+            )
+        return merged
+
+    def _run(
+        self, method, df_list, x_timestamp_list, y_timestamp_list, pred_len, kwargs
+    ):
+        sample_count = kwargs.get("sample_count", 8)
+        num_series = len(df_list)
+        total_paths = np.sum(np.broadcast_to(sample_count, num_series))
+        # memory is estimated for the series with the most paths
+        sample_count = np.max(sample_count)
+        if kwargs.get("seed") is not None:
+            # seeded by global index, so the paths do not depend on the micro-batch sizes
+            kwargs = {**kwargs, "seed": series_seeds(kwargs["seed"], num_series)}
+        # longest histories first, so every micro-batch pads to a similar length
+        by_length = sorted(range(num_series), key=lambda i: -len(df_list[i]))
+
+        def chunk(start, size):
+            index = by_length[start : start + size]
+            chunk_kwargs = dict(kwargs)
+            if kwargs.get("series_keys") is not None:
+                keys = kwargs["series_keys"]
+                chunk_kwargs["series_keys"] = [keys[i] for i in index]
+            if kwargs.get("seed") is not None:
+                chunk_kwargs["seed"] = kwargs["seed"][index]
+            if np.ndim(kwargs.get("sample_count", 8)):
+                chunk_kwargs["sample_count"] = np.asarray(kwargs["sample_count"])[index]
+            return index, (
+                method,
+                [df_list[i] for i in index],
+                [x_timestamp_list[i] for i in index],
+                [y_timestamp_list[i] for i in index],
+                pred_len,
+                chunk_kwargs,
+            )
+
+        results = []
+        batch_sizes = []
+        index_order = []
+        start_rss = current_rss_bytes()
+        max_rss = start_rss
+        start = time.perf_counter()
+
+        if self.workers == 1:
+            pos = 0
+            while pos < num_series:
+                size = self.batch_size(
+                    len(df_list[by_length[pos]]), pred_len, sample_count
+                )
+                index, job = chunk(pos, size)
+                tic = time.perf_counter()
+                results.append(self._call(self.predictor, *job))
+                self._seconds_per_series = (time.perf_counter() - tic) / len(index)
+                max_rss = max(max_rss, current_rss_bytes())
+                batch_sizes.append(len(index))
+                index_order.extend(index)
+                pos += len(index)
+        else:
+            jobs = []
+            pos = 0
+            while pos < num_series:
+                size = self.batch_size(
+                    len(df_list[by_length[pos]]), pred_len, sample_count
+                )
+                jobs.append(chunk(pos, size))
+                pos += len(jobs[-1][0])
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [
+                    pool.submit(self._call, self._replicas[n % self.workers], *job)
+                    for n, (_, job) in enumerate(jobs)
+                ]
+                for (index, _), future in zip(jobs, futures):
+                    results.append(future.result())
+                    max_rss = max(max_rss, current_rss_bytes())
+                    batch_sizes.append(len(index))
+                    index_order.extend(index)
+
+        seconds = time.perf_counter() - start
+        if self.workers > 1:
+            # the parallel sizes are fixed up front, so they adapt from one call to the next
+            self._seconds_per_series = seconds * self.workers / num_series
+        self.last_report = {
+            "series": num_series,
+            "micro_batches": len(batch_sizes),
+            "batch_sizes": batch_sizes,
+            "workers": self.workers,
+            "seconds": seconds,
+            "series_per_s": num_series / seconds,
+            "paths_per_s": total_paths / seconds,
+            "rss_mb": max_rss / 2**20,
+            "rss_growth_mb": (max_rss - start_rss) / 2**20,
+            "peak_rss_mb": max(peak_rss_bytes(), max_rss) / 2**20,
+        }
+        # position of every input series in the concatenated results
+        return results, np.argsort(index_order)
+
+    @staticmethod
+    def _call(
+        predictor, method, df_list, x_timestamp_list, y_timestamp_list, pred_len, kwargs
+    ):
+        return getattr(predictor, method)(
+            df_list, x_timestamp_list, y_timestamp_list, pred_len, **kwargs
+        )
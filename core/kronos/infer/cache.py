@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+
+def prediction_key(arrays, params, namespace=""):
+    """
+    Content hash of a prediction: the bytes, dtypes and shapes of `arrays` plus the `params` dict.
+
+    None entries in `arrays` (e.g. a batch without padding) are hashed as a marker of their own.
+    """
+    digest = hashlib.blake2b(namespace.encode("utf-8"), digest_size=20)
+    for array in arrays:
+        if array is None:
+            digest.update(b"\x00none")
+            continue
+        array = np.ascontiguousarray(np.asarray(array))
+        digest.update(f"\x00{array.dtype.str}{array.shape}".encode("utf-8"))
+        digest.update(memoryview(array).cast("B"))
+    digest.update(repr(sorted(params.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of seeded predictions (NumPy arrays).
+
+    Identical windows come back on retries after a failed order, when several strategies look at
+    the same coin and in backtests that revisit the same bars. A seeded prediction is a pure
+    function of its inputs, so it is stored under the hash of the normalized input arrays, the
+    timestamps, the sampling parameters and the seed (see `KronosPredictor._cached`).
+
+    Entries live in an in-memory LRU of `max_entries` results and, with `disk_dir`, are also
+    written there as one .npz file per key, which survives restarts and is shared by processes.
+    The files hold plain arrays and are read without unpickling. The disk tier is an LRU as well:
+    hits refresh the modification time of their file, and after each write the least recently
+    used files are removed until the tier fits into `max_disk_mb`.
+    Attach it with `predictor.prediction_cache = PredictionCache(...)`.
+
+    Args:
+        max_entries (int): Results kept in memory. Defaults to 256.
+        disk_dir (str, optional): Directory of the on-disk tier. Defaults to None (memory only).
+        namespace (str): Mixed into every key; results of different weights must not share one.
+        max_disk_mb (float): Size limit of the on-disk tier. Defaults to 256.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None, namespace="", max_disk_mb=256):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.namespace = namespace
+        self.max_disk_bytes = int(max_disk_mb * 2**20)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get_or_compute(self, arrays, params, compute):
+        """Returns the cached result for `arrays`/`params`, or stores and returns `compute()`."""
+        key = prediction_key(arrays, params, self.namespace)
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        # callers own their result, the cached copy stays untouched
+        return value.copy()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+        if self.disk_dir is not None:
+            path = self._path(key)
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    value = data["value"]
+                os.utime(path)  # most recently used
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                pass  # missing, evicted meanwhile, or not a cache entry
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, value)
+                return True, value
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        value = np.asarray(value)
+        self._remember(key, value)
+        if self.disk_dir is not None:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, value=value)
+            os.replace(tmp, path)  # readers never see a partial entry
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Removes the least recently used files until the disk tier fits into `max_disk_bytes`."""
+        files = []
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed by another process
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def clear(self):
+        """Drops the in-memory entries (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def __deepcopy__(self, memo):
+        # predictor replicas (e.g. of MicroBatchScheduler) share one cache
+        return self
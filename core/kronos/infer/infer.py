@@ -1,58 +1,185 @@
-import pandas as pd
+import functools
+import hashlib
+import os
+import time
+
 import numpy as np
-from core.config import Config
-from core.kronos.model.kronos import Kronos, KronosTokenizer, KronosPredictor
+import pandas as pd
+from core.config import get_config
+from core.kronos.model.kronos import (
+    Kronos,
+    KronosTokenizer,
+    KronosPredictor,
+    epoch_ms,
+    load_pretrained,
+)
+from core.kronos.model.module import set_attention_backend
+from core.kronos.infer.adaptive import adaptive_distribution
+from core.kronos.infer.batching import MicroBatchScheduler
+from core.kronos.infer.cache import PredictionCache
+from core.kronos.infer.sharding import ShardPool
 
-configs = Config()
+configs = get_config()
+set_attention_backend(configs.attn_backend)
 
-# 1. Load Model and Tokenizer
-tokenizer = KronosTokenizer.from_pretrained(configs.infer_tokenizer_path)
-model = Kronos.from_pretrained(configs.infer_predictor_path)
 
-# 2. Instantiate Predictor
-predictor = KronosPredictor(
-    model, tokenizer, device=configs.device, max_context=configs.max_context
-)
+def process_age_s():
+    """Wall time since this process started, in seconds (Linux /proc, else None)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # the fields after the command name, the 22nd overall is the start time in clock ticks
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
 
 
-def infer_predict(dfs: list, tps: list):
-    # 时间序列外推
-    diff_tp = tps[0].iloc[1] - tps[0].iloc[0]
-    last_dates = [tp.iloc[-1] for tp in tps]
-    future_dates = [
-        [last_date + (i + 1) * diff_tp for i in range(configs.predict_window)]
-        for last_date in last_dates
-    ]
-    future_series = [
-        pd.Series(future_date, dtype=tps[0]) for future_date in future_dates
-    ]
+# 启动耗时: import (从进程启动算起) / 权重加载 / 预热 / 首次推理
+startup_report = {"import_s": process_age_s()}
+
 
-    # 每个coin推理8次做平均
-    k = 8
-    idfs = [df for _ in range(k) for df in dfs]
-    itps_x = [tp for _ in range(k) for tp in tps]
-    itps_y = [fs for _ in range(k) for fs in future_series]
-
-    pred_df = predictor.predict_batch(
-        df_list=idfs,
-        x_timestamp_list=itps_x,
-        y_timestamp_list=itps_y,
-        pred_len=configs.predict_window,
+@functools.lru_cache(maxsize=None)
+def get_predictor():
+    """Loads the model and tokenizer on first use and returns the shared `KronosPredictor`."""
+    # 1. Load Model and Tokenizer
+    start = time.perf_counter()
+    tokenizer = load_pretrained(
+        KronosTokenizer, configs.infer_tokenizer_path, configs.infer_mmap_weights
+    )
+    model = load_pretrained(
+        Kronos, configs.infer_predictor_path, configs.infer_mmap_weights
     )
 
-    close_list = [df["close"].iloc[-1] for df in dfs]
-    infer_return = []
-    for idx in range(len(dfs)):
-        rs = [pred_df[i + idx] for i in range(0, len(pred_df), len(dfs))]
-        result = [df["close"].iloc[-1] for df in rs]
-        result = sorted(result)
+    # 2. Instantiate Predictor
+    predictor = KronosPredictor(
+        model,
+        tokenizer,
+        device=configs.device,
+        max_context=configs.max_context,
+        precision=configs.infer_precision,
+        norm_anchor=configs.infer_norm_anchor,
+        anchor_max_len=configs.infer_anchor_max_len,
+    )
+    startup_report["weight_load_s"] = time.perf_counter() - start
 
-        n_avg = np.average(result)
-        n_start = close_list[idx]
-        count_gtn = sum(1 for x in result if x > n_start)
-        up_precent = count_gtn / len(result)
-        avg_precent = (n_avg - n_start) / n_start
+    if configs.infer_warmup:
+        startup_report["warmup_s"] = predictor.warm_up()
+    if configs.infer_processes > 1:
+        predictor.shard_pool = ShardPool(
+            predictor,
+            configs.infer_processes,
+            threads_per_process=configs.infer_threads_per_process,
+            seed=configs.seed,
+        )
+    if configs.infer_cache_entries:
+        # attached after the workers started, they never see the cache
+        predictor.prediction_cache = PredictionCache(
+            configs.infer_cache_entries,
+            configs.infer_cache_dir,
+            namespace=f"{configs.infer_predictor_path}|{configs.infer_tokenizer_path}",
+            max_disk_mb=configs.infer_cache_disk_mb,
+        )
+    return predictor
 
-        infer_return.append([up_precent, avg_precent])
 
-    return infer_return
+@functools.lru_cache(maxsize=None)
+def get_scheduler():
+    # 3. Micro-batching in front of the predictor, so large watchlists stay within budget
+    return MicroBatchScheduler(
+        get_predictor(),
+        memory_budget_mb=configs.infer_memory_budget_mb,
+        latency_budget_s=configs.infer_latency_budget_s,
+        workers=configs.infer_workers,
+    )
+
+
+def future_timestamps(tps: list, pred_len: int):
+    # 时间序列外推, 每个序列按自己的K线间隔
+    future_series = []
+    for tp in tps:
+        if isinstance(tp, np.ndarray):
+            # int64 毫秒时间戳 (K线缓冲区), 不经过pandas
+            future_series.append(tp[-1] + (tp[1] - tp[0]) * np.arange(1, pred_len + 1))
+            continue
+        diff_tp = tp.iloc[1] - tp.iloc[0]
+        last_date = tp.iloc[-1]
+        future_date = [last_date + (i + 1) * diff_tp for i in range(pred_len)]
+        future_series.append(pd.Series(future_date, dtype=tp.dtype))
+    return future_series
+
+
+def window_seeds(seed, dfs, tps, keys=None):
+    """
+    Per-series sampling seeds of one cycle, derived from `seed`, the series (its key, or its last
+    close without keys) and the open time of its last bar.
+
+    Every new bar draws new paths, so the sampling error averages out over the cycles instead of
+    repeating, while a window seen again (a retry, a backtest revisiting the same bars) gets its
+    seed back: its prediction is reproduced, and served from the prediction cache.
+    """
+    seeds = []
+    for i, (df, tp) in enumerate(zip(dfs, tps)):
+        if keys is not None:
+            identity = repr(keys[i]).encode("utf-8")
+        else:
+            close = df[-1, 3] if isinstance(df, np.ndarray) else df["close"].iloc[-1]
+            identity = np.float64(close).tobytes()
+        digest = hashlib.blake2b(identity, digest_size=8).digest()
+        entropy = [seed, int.from_bytes(digest, "little"), int(epoch_ms(tp)[-1])]
+        seeds.append(np.random.SeedSequence(entropy).generate_state(1)[0])
+    return np.array(seeds, dtype=np.int64)
+
+
+def infer_predict(
+    dfs: list, tps: list, pred_len: int = None, sample_count: int = 8, keys=None
+):
+    if pred_len is None:
+        pred_len = configs.predict_window
+    future_series = future_timestamps(tps, pred_len)
+    scheduler = get_scheduler()
+
+    # 每个coin采样sample_count(默认8)条路径, 统计上涨概率与平均涨幅
+    # 种子随每根新K线变化: 各周期的采样互不重复; 相同窗口结果可复现, 直接命中缓存
+    seed = window_seeds(configs.seed, dfs, tps, keys)
+    start = time.perf_counter()
+    if configs.infer_adaptive:
+        # 分轮采样, 上涨概率的置信区间已确定多/空/观望时提前停止
+        dist = adaptive_distribution(
+            scheduler,
+            dfs,
+            tps,
+            future_series,
+            pred_len,
+            thresholds=(configs.short_threshold, configs.long_threshold),
+            round_size=configs.infer_round_size,
+            max_samples=configs.infer_max_samples,
+            confidence=configs.infer_confidence,
+            series_keys=keys,
+            seed=seed,
+        )
+    else:
+        dist = scheduler.predict_distribution(
+            dfs,
+            tps,
+            future_series,
+            pred_len,
+            sample_count=sample_count,
+            last_step_only=True,  # 只用到最后一根K线的收盘价
+            series_keys=keys,  # 按coin复用上一周期的prompt缓存
+            seed=seed,
+        )
+    if "first_inference_s" not in startup_report:
+        startup_report["first_inference_s"] = time.perf_counter() - start
+        if configs.debug:
+            print(f"[infer] startup {startup_report}")
+    if configs.debug:
+        print(f"[infer] {scheduler.last_report}")
+        if scheduler.predictor.prediction_cache is not None:
+            print(f"[infer] cache {scheduler.predictor.prediction_cache.stats()}")
+
+    return [
+        [up_precent, avg_precent]
+        for up_precent, avg_precent in zip(dist["prob_up"], dist["mean_return"])
+    ]
@@ -0,0 +1,272 @@
+"""
+Local prediction daemon: keeps the Kronos model resident and serves `infer_predict` over a Unix socket.
+
+Requests that arrive within `Config.infer_batch_window_ms` of each other are coalesced into one
+prediction batch, so several trading processes share a single warmed-up model.
+
+Run with `python -m core.kronos.infer.server` and set `Config.infer_use_server = True` in the clients.
+
+Protocol (little-endian, every message is a u32 payload length followed by the payload):
+
+    request:  b"KRQ2" | u16 n_series | u16 pred_len (0: server default) | u16 sample_count
+              then per series: u32 seq_len | i64[seq_len] timestamps in ms
+                               | f64[seq_len, 6] open, high, low, close, volume, amount
+    response: b"KRR1" | u8 status (0: ok, 1: error) | u16 n_series
+              then f64[n_series, 2] (prob_up, mean_return), or a utf-8 error message
+"""
+
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from core.config import get_config
+
+COLUMNS = ["open", "high", "low", "close", "volume", "amount"]
+
+REQUEST_MAGIC = b"KRQ2"
+RESPONSE_MAGIC = b"KRR1"
+_FRAME = struct.Struct("<I")
+_REQUEST = struct.Struct("<4sHHH")
+_RESPONSE = struct.Struct("<4sBH")
+_SERIES = struct.Struct("<I")
+
+
+def encode_request(dfs, tps, pred_len=0, sample_count=8):
+    parts = [_REQUEST.pack(REQUEST_MAGIC, len(dfs), pred_len, sample_count)]
+    for df, tp in zip(dfs, tps):
+        stamps = np.asarray(tp, dtype="datetime64[ms]").astype("<i8")
+        if isinstance(df, np.ndarray):
+            values = np.ascontiguousarray(df, dtype="<f8")
+        else:
+            values = df[COLUMNS].to_numpy(dtype="<f8")
+        parts += [_SERIES.pack(len(stamps)), stamps.tobytes(), values.tobytes()]
+    return b"".join(parts)
+
+
+def decode_request(payload):
+    magic, n_series, pred_len, sample_count = _REQUEST.unpack_from(payload)
+    if magic != REQUEST_MAGIC:
+        raise ValueError(f"Unknown request magic {magic!r}.")
+    offset = _REQUEST.size
+    dfs, tps = [], []
+    for _ in range(n_series):
+        (seq_len,) = _SERIES.unpack_from(payload, offset)
+        offset += _SERIES.size
+        stamps = np.frombuffer(payload, "<i8", seq_len, offset)
+        offset += stamps.nbytes
+        values = np.frombuffer(payload, "<f8", seq_len * len(COLUMNS), offset)
+        offset += values.nbytes
+        dfs.append(pd.DataFrame(values.reshape(seq_len, len(COLUMNS)), columns=COLUMNS))
+        tps.append(pd.Series(stamps.astype("datetime64[ms]")))
+    return dfs, tps, pred_len, sample_count
+
+
+def encode_response(results=None, error=None):
+    if error is not None:
+        return _RESPONSE.pack(RESPONSE_MAGIC, 1, 0) + str(error).encode("utf-8")
+    rows = np.asarray(results, dtype="<f8").reshape(-1, 2)
+    return _RESPONSE.pack(RESPONSE_MAGIC, 0, len(rows)) + rows.tobytes()
+
+
+def decode_response(payload):
+    magic, status, n_series = _RESPONSE.unpack_from(payload)
+    if magic != RESPONSE_MAGIC:
+        raise ValueError(f"Unknown response magic {magic!r}.")
+    body = payload[_RESPONSE.size :]
+    if status != 0:
+        raise RuntimeError(f"Inference server error: {body.decode('utf-8')}")
+    return np.frombuffer(body, "<f8", n_series * 2).reshape(n_series, 2).tolist()
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while size:
+        n = sock.recv_into(view, size)
+        if n == 0:
+            raise ConnectionError("Connection closed by peer.")
+        view = view[n:]
+        size -= n
+    return bytes(buf)
+
+
+def read_frame(sock):
+    (size,) = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    return _recv_exact(sock, size)
+
+
+def write_frame(sock, payload):
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+
+class RequestBatcher:
+    """
+    Coalesces concurrent requests into prediction batches.
+
+    The first pending request opens a window of `window_s` seconds; everything submitted
+    until it closes (or until `max_series` series are queued) is predicted together.
+    Requests with different `pred_len`/`sample_count` are batched separately.
+
+    Args:
+        predict_fn (Callable): `predict_fn(dfs, tps, pred_len, sample_count)` returning one row per series,
+                               e.g. `infer_predict`.
+        window_s (float): Time to wait for more requests after the first one.
+        max_series (int): Closes the window early once this many series are pending.
+    """
+
+    def __init__(self, predict_fn, window_s=0.01, max_series=256):
+        self.predict_fn = predict_fn
+        self.window_s = window_s
+        self.max_series = max_series
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, dfs, tps, pred_len, sample_count):
+        future = Future()
+        self._queue.put((dfs, tps, pred_len, sample_count, future))
+        return future
+
+    def _loop(self):
+        while True:
+            pending = [self._queue.get()]
+            n_series = len(pending[0][0])
+            deadline = time.monotonic() + self.window_s
+            while n_series < self.max_series:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                n_series += len(pending[-1][0])
+
+            groups = {}
+            for request in pending:
+                groups.setdefault(request[2:4], []).append(request)
+            for (pred_len, sample_count), requests in groups.items():
+                self._run(pred_len, sample_count, requests)
+
+    def _run(self, pred_len, sample_count, requests):
+        dfs = [df for request in requests for df in request[0]]
+        tps = [tp for request in requests for tp in request[1]]
+        try:
+            results = self.predict_fn(dfs, tps, pred_len, sample_count)
+        except Exception as e:
+            for request in requests:
+                request[4].set_exception(e)
+            return
+        start = 0
+        for request in requests:
+            end = start + len(request[0])
+            request[4].set_result(results[start:end])
+            start = end
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # a connection stays open for any number of requests
+        while True:
+            try:
+                payload = read_frame(self.request)
+            except ConnectionError:
+                return
+            try:
+                dfs, tps, pred_len, sample_count = decode_request(payload)
+                results = self.server.batcher.submit(
+                    dfs, tps, pred_len or None, sample_count
+                ).result()
+                response = encode_response(results)
+            except Exception as e:
+                response = encode_response(error=f"{type(e).__name__}: {e}")
+            write_frame(self.request, response)
+
+
+class PredictionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, batcher):
+        self.batcher = batcher
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket of a previous run
+        super().__init__(path, _RequestHandler)
+
+
+class PredictionClient:
+    """
+    Client of the prediction daemon, with the same result format as `infer_predict`.
+
+    The connection is kept open between calls and re-established once if the server restarted.
+    Any other failure (a timeout, an undecodable response) closes it and is raised.
+    Series keys are not part of the protocol, so predictions through the daemon are never
+    warm-started from cached prompts.
+    """
+
+    def __init__(self, path=None, timeout=60.0):
+        self.path = path or get_config().infer_server_path
+        self.timeout = timeout
+        self._sock = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def predict(self, dfs, tps, pred_len=0, sample_count=8, keys=None):
+        payload = encode_request(dfs, tps, pred_len, sample_count)
+        for attempt in range(2):
+            if self._sock is None:
+                self._sock = self._connect()
+            try:
+                write_frame(self._sock, payload)
+                return decode_response(read_frame(self._sock))
+            except ConnectionError:
+                self.close()
+                if attempt:
+                    raise
+            except BaseException:
+                # e.g. a timeout: the late response must not be read as the answer to the next request
+                self.close()
+                raise
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def serve(path=None):
+    configs = get_config()
+    path = path or configs.infer_server_path
+
+    # loads (and warms up) the model once, for the lifetime of the daemon
+    from core.kronos.infer.infer import get_predictor, infer_predict
+
+    get_predictor()
+
+    batcher = RequestBatcher(
+        infer_predict, window_s=configs.infer_batch_window_ms / 1000
+    )
+    with PredictionServer(path, batcher) as server:
+        print(f"[infer-server] listening on {path}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,265 @@
+import copy
+import os
+import queue
+import threading
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from core.kronos.model.kronos import series_seeds
+from core.kronos.model.module import get_attention_backend, set_attention_backend
+
+
+def _worker(rank, predictor, threads, cpus, seed, attn_backend, tasks, results):
+    # spawned workers re-import the model modules with their defaults
+    set_attention_backend(attn_backend)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed by an earlier parallel call in this process
+    torch.manual_seed(seed + rank)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, args, kwargs = task
+        try:
+            results.put((task_id, predictor.generate(*args, **kwargs), None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class ShardPool:
+    """
+    Shards the series of a `KronosPredictor.generate` call across worker processes.
+
+    The model and tokenizer weights are moved to shared memory once and mapped by every worker,
+    so N workers do not hold N copies. Each worker runs with its own intra-op thread count and,
+    on Linux, is pinned to its own block of cores; small d_model matrices scale much better
+    this way than with one process using every core. The coordinator (the `generate` call)
+    scatters the normalized windows, the workers sample their paths, and the results are
+    gathered in input order.
+
+    Attach it with `predictor.shard_pool = ShardPool(predictor, ...)`; all the `predict_*` methods
+    then go through the workers. int8-dynamic weights are packed outside of tensor storage and
+    are copied into each worker instead of shared.
+
+    Args:
+        predictor (KronosPredictor): Predictor whose weights the workers share.
+        processes (int): Number of worker processes.
+        threads_per_process (int, optional): Intra-op threads per worker.
+                                             Defaults to the available cores divided by `processes`.
+        pin_cores (bool): Pin every worker to `threads_per_process` cores of its own. Defaults to True.
+        seed (int, optional): Worker w seeds torch with `seed + w`. Defaults to torch's initial seed.
+        poll_s (float): Interval at which a waiting call checks that the workers are alive. A dead
+                        worker (OOM, segfault, killed) fails the call and the pool is restarted.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        processes,
+        threads_per_process=None,
+        pin_cores=True,
+        seed=None,
+        poll_s=1.0,
+    ):
+        if processes < 1:
+            raise ValueError(f"processes must be at least 1, got {processes}.")
+        if torch.device(predictor.device).type != "cpu":
+            raise ValueError("Process sharding is only supported on CPU.")
+
+        cores = (
+            sorted(os.sched_getaffinity(0))
+            if hasattr(os, "sched_getaffinity")
+            else list(range(os.cpu_count() or 1))
+        )
+        self.processes = processes
+        self.threads_per_process = threads_per_process or max(
+            1, len(cores) // processes
+        )
+        self.poll_s = poll_s
+        # what the workers receive; the pool and cache attached to `predictor` later stay behind
+        self._predictor = copy.copy(predictor)
+        self._cores = cores if pin_cores else None
+        self._seed = torch.initial_seed() if seed is None else seed
+        self._attn_backend = get_attention_backend()
+
+        predictor.model.share_memory()
+        predictor.tokenizer.share_memory()
+
+        self._ctx = mp.get_context("spawn")
+        self._next_task = 0
+        self._lock = threading.Lock()
+        self._workers = []
+        self._start()
+
+    def _start(self):
+        # fresh queues, so nothing of a failed call can reach the next one
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._workers = []
+        for rank in range(self.processes):
+            cpus = None
+            if self._cores and len(self._cores) >= (
+                self.processes * self.threads_per_process
+            ):
+                start = rank * self.threads_per_process
+                cpus = set(self._cores[start : start + self.threads_per_process])
+            worker = self._ctx.Process(
+                target=_worker,
+                args=(
+                    rank,
+                    self._predictor,
+                    self.threads_per_process,
+                    cpus,
+                    self._seed,
+                    self._attn_backend,
+                    self._tasks,
+                    self._results,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _restart(self):
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        for q in (self._tasks, self._results):
+            q.close()
+            q.cancel_join_thread()
+        self._start()
+
+    def generate(
+        self,
+        x,
+        x_stamp,
+        y_stamp,
+        pred_len,
+        T,
+        top_k,
+        top_p,
+        sample_count,
+        verbose,
+        average=True,
+        decode_len=None,
+        padding_mask=None,
+        seed=None,
+    ):
+        """
+        Same as `KronosPredictor.generate`, with the series split evenly over the workers.
+        A `seed` is turned into per-series seeds before the split (see `series_seeds`), so the
+        results do not depend on the number of processes.
+        """
+        with self._lock:  # the result queue is shared, one call at a time
+            return self._generate(
+                x,
+                x_stamp,
+                y_stamp,
+                pred_len,
+                (T, top_k, top_p, sample_count, verbose),
+                average,
+                decode_len,
+                padding_mask,
+                seed,
+            )
+
+    def _generate(
+        self,
+        x,
+        x_stamp,
+        y_stamp,
+        pred_len,
+        sampling,
+        average,
+        decode_len,
+        padding_mask,
+        seed,
+    ):
+        x, x_stamp, y_stamp = np.asarray(x), np.asarray(x_stamp), np.asarray(y_stamp)
+        shards = np.array_split(np.arange(len(x)), min(self.processes, len(x)))
+        seed = series_seeds(seed, len(x))
+
+        task_ids = []
+        for index in shards:
+            mask = None
+            start = 0
+            if padding_mask is not None:
+                mask = np.asarray(padding_mask)[index]
+                # drop the leading positions that are padding in every series of the shard
+                start = int(np.argmin(mask.all(axis=0)))
+                mask = mask[:, start:]
+                if not mask.any():
+                    mask = None
+            T, top_k, top_p, sample_count, verbose = sampling
+            if np.ndim(sample_count):
+                sample_count = np.asarray(sample_count)[index]
+            args = (
+                x[index, start:],
+                x_stamp[index, start:],
+                y_stamp[index],
+                pred_len,
+                T,
+                top_k,
+                top_p,
+                sample_count,
+                verbose,
+            )
+            kwargs = {
+                "average": average,
+                "decode_len": decode_len,
+                "padding_mask": mask,
+                "seed": None if seed is None else seed[index],
+            }
+            self._tasks.put((self._next_task, args, kwargs))
+            task_ids.append(self._next_task)
+            self._next_task += 1
+
+        outputs = {}
+        errors = []
+        pending = set(task_ids)
+        while pending:
+            try:
+                task_id, preds, error = self._results.get(timeout=self.poll_s)
+            except queue.Empty:
+                dead = [w.exitcode for w in self._workers if not w.is_alive()]
+                if dead:
+                    self._restart()
+                    raise RuntimeError(
+                        f"Inference worker died (exit code {dead[0]}), pool restarted."
+                    )
+                continue
+            if task_id not in pending:
+                continue  # late result of an earlier, failed call
+            pending.discard(task_id)
+            outputs[task_id] = preds
+            if error is not None:
+                errors.append(error)
+        if errors:
+            raise RuntimeError(f"Inference worker failed: {errors[0]}")
+        return np.concatenate([outputs[task_id] for task_id in task_ids], axis=0)
+
+    def close(self):
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __deepcopy__(self, memo):
+        # predictor replicas (e.g. of MicroBatchScheduler) share the worker processes
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
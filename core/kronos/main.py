@@ -1,23 +1,48 @@
-from core.okx.kline import get_okx_data
-from core.kronos.infer.infer import infer_predict
-from core.config import Config
+from core.okx.async_kline import fetch_okx_data
+from core.okx.candle_buffer import MarketDataCache
+from core.okx.candle_store import CandleStore, sync_stores
+from core.config import get_config
 
-configs = Config()
+configs = get_config()
+
+if configs.infer_use_server:
+    # 模型常驻在推理服务进程中 (python -m core.kronos.infer.server)
+    from core.kronos.infer.server import PredictionClient
+
+    infer_predict = PredictionClient(configs.infer_server_path).predict
+else:
+    from core.kronos.infer.infer import infer_predict
+
+# 每个coin一个K线环形缓冲区, 跨周期常驻内存
+market_data = MarketDataCache(configs.lookback_window)
 
 
 def main_infer():
     target_coin = configs.target_coins
 
+    inst_ids = [f"{coin}-USDT" for coin in target_coin]
+    if configs.candle_store_dir:
+        # 本地K线库只增量同步最新的K线, 每个coin每周期最多一次请求
+        stores = [CandleStore(configs.candle_store_dir, i) for i in inst_ids]
+        written = sync_stores(stores, configs.lookback_window)
+        for store, n in zip(stores, written):
+            market_data.update_from_store(store, n)
+        # 直接把缓冲区的numpy视图交给模型, 不经过DataFrame
+        values, timestamps = market_data.windows(inst_ids, configs.lookback_window)
+        r = infer_predict(values, timestamps, keys=target_coin)
+        return {target_coin[i]: r[i] for i in range(len(r))}
+
+    # 所有coin并发拉取K线, 共用连接池与限流
+    frames = fetch_okx_data(inst_ids, configs.lookback_window)
     dfs = []
     tps = []
-    for coin in target_coin:
-        df = get_okx_data(f"{coin}-USDT", configs.lookback_window)
+    for df in frames:
         x_df = df.loc[:, ["open", "high", "low", "close", "volume", "amount"]]
         x_timestamp = df.loc[:, "timestamps"]
         dfs.append(x_df)
         tps.append(x_timestamp)
 
-    r = infer_predict(dfs, tps)
+    r = infer_predict(dfs, tps, keys=target_coin)
     return {target_coin[i]: r[i] for i in range(len(r))}
 
 
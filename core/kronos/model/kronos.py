@@ -1,8 +1,14 @@
+import copy
+import json
+import mmap
+import os
+import struct
+import time
+
 import numpy as np
 import pandas as pd
 import torch
 from huggingface_hub import PyTorchModelHubMixin
-import sys
 from tqdm import trange
 
 from .module import *
@@ -189,40 +195,68 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
         x = x * q_scale
         return x
 
-    def encode(self, x, half=False):
+    def encode(self, x, half=False, padding_mask=None, use_cache=False):
         """
         Encodes the input data into quantized indices.
 
         Args:
             x (torch.Tensor): Input tensor of shape (batch_size, seq_len, d_in).
             half (bool, optional): Whether to use half quantization in BSQuantizer. Defaults to False.
+            padding_mask (torch.Tensor, optional): Mask for (left) padding positions, True marks padding.
+                                                   Shape: [batch_size, seq_len], covering the cached positions
+                                                   as well when `use_cache=True`. Defaults to None.
+            use_cache (bool, optional): Whether `x` continues the sequence held in the encoder key/value
+                                        caches; only the new positions are encoded. Defaults to False.
 
         Returns:
-            torch.Tensor: Quantized indices from BSQuantizer.
+            torch.Tensor: Quantized indices from BSQuantizer. The indices at padding positions are arbitrary.
         """
         z = self.embed(x)
         for layer in self.encoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask, use_cache=use_cache)
         z = self.quant_embed(z)
 
-        bsq_loss, quantized, z_indices = self.tokenizer(z, half)
-        return z_indices
+        # only the indices are needed here, so skip the quantizer losses and metrics
+        return self.tokenizer.encode(z, half)
+
+    def reset_cache(self):
+        """Drops the key/value caches kept by the encoder and decoder self-attention layers."""
+        for layer in self.encoder:
+            layer.self_attn.reset_cache()
+        for layer in self.decoder:
+            layer.self_attn.reset_cache()
+
+    def repeat_cache(self, repeats, capacity=None):
+        """Fans every cached decoder row out to `repeats` consecutive rows, reserving `capacity` positions."""
+        for layer in self.decoder:
+            layer.self_attn.repeat_cache(repeats, capacity)
 
-    def decode(self, x, half=False):
+    def decode(self, x, half=False, use_cache=False, tail=None, padding_mask=None):
         """
         Decodes quantized indices back to the input data space.
 
+        With `use_cache=True` the indices continue the sequence held in the decoder key/value caches
+        (e.g. a prefix decoded once and fanned out with `repeat_cache`); only the new positions are processed.
+
         Args:
             x (torch.Tensor): Quantized indices tensor.
             half (bool, optional): Whether the indices were generated with half quantization. Defaults to False.
+            use_cache (bool, optional): Whether to decode incrementally on top of the decoder caches. Defaults to False.
+            tail (int, optional): Only reconstruct the last `tail` positions of `x`. Defaults to None (all positions).
+            padding_mask (torch.Tensor, optional): Mask for (left) padding positions, True marks padding.
+                                                   Shape: [batch_size, seq_len], covering the cached positions
+                                                   as well when `use_cache=True`. Defaults to None.
 
         Returns:
-            torch.Tensor: Reconstructed output tensor of shape (batch_size, seq_len, d_in).
+            torch.Tensor: Reconstructed output tensor of shape (batch_size, seq_len, d_in),
+                          or (batch_size, tail, d_in) when `tail` is given.
         """
         quantized = self.indices_to_bits(x, half)
         z = self.post_quant_embed(quantized)
         for layer in self.decoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask, use_cache=use_cache)
+        if tail is not None:
+            z = z[:, z.size(1) - tail :]
         z = self.head(z)
         return z
 
@@ -359,18 +393,97 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
         s2_logits = self.head.cond_forward(x2)
         return s1_logits, s2_logits
 
-    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None):
+    def reset_cache(self):
+        """Drops the key/value caches kept by the self-attention layers."""
+        for layer in self.transformer:
+            layer.self_attn.reset_cache()
+        self.dep_layer.cross_attn.reset_cache()
+
+    def repeat_cache(self, repeats, capacity=None):
+        """Fans every cached row out to `repeats` consecutive rows, reserving `capacity` positions, see `prefill`."""
+        for layer in self.transformer:
+            layer.self_attn.repeat_cache(repeats, capacity)
+        self.dep_layer.cross_attn.repeat_cache(repeats, capacity)
+
+    def prefill(
+        self,
+        s1_ids,
+        s2_ids,
+        stamp=None,
+        padding_mask=None,
+        repeats=1,
+        capacity=None,
+        time_embedding=None,
+        keep_prefix=False,
+    ):
+        """
+        Runs a prompt through the caches once and broadcasts the state to `repeats` sample paths per row.
+
+        The caches are reset first, unless `keep_prefix` is set: then the prompt continues the prefix
+        already loaded into the caches (and `padding_mask` covers both). The self-attention caches are
+        filled with the whole prompt and the cross-attention cache with all but its last context
+        position; that position is returned, so the following `decode_s2(context, s1_ids, use_cache=True)` call completes the s2 cache.
+
+        Args:
+            s1_ids (torch.Tensor): Prompt s1 token IDs. Shape: [batch_size, seq_len]
+            s2_ids (torch.Tensor): Prompt s2 token IDs. Shape: [batch_size, seq_len]
+            stamp (torch.Tensor, optional): Temporal stamp tensor. Shape: [batch_size, seq_len]. Defaults to None.
+            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            repeats (int, optional): Number of sample paths per prompt. Defaults to 1.
+            capacity (int, optional): Sequence length to reserve in the caches for the following
+                                      incremental steps. Defaults to None (grow on demand).
+            time_embedding (torch.Tensor, optional): Precomputed `time_emb(stamp)`, see `decode_s1`.
+            keep_prefix (bool, optional): Continue the cached prefix instead of resetting the caches.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]:
+                - s1 logits of the last position. Shape: [batch_size * repeats, 1, s1_vocab_size]
+                - context of the last position. Shape: [batch_size * repeats, 1, d_model]
+        """
+        if not keep_prefix:
+            self.reset_cache()
+        s1_logits, context = self.decode_s1(
+            s1_ids,
+            s2_ids,
+            stamp,
+            padding_mask,
+            use_cache=True,
+            time_embedding=time_embedding,
+        )
+        self.dep_layer.cross_attn.extend_cache(context[:, :-1], context[:, :-1])
+        self.repeat_cache(repeats, capacity)
+        return (
+            s1_logits[:, -1:].repeat_interleave(repeats, dim=0),
+            context[:, -1:].repeat_interleave(repeats, dim=0),
+        )
+
+    def decode_s1(
+        self,
+        s1_ids,
+        s2_ids,
+        stamp=None,
+        padding_mask=None,
+        use_cache=False,
+        time_embedding=None,
+    ):
         """
         Decodes only the s1 tokens.
 
         This method performs a forward pass to predict only s1 tokens. It returns the s1 logits
         and the context representation from the Transformer, which can be used for subsequent s2 decoding.
 
+        With `use_cache=True` the inputs are treated as the continuation of the sequence already held
+        in the attention key/value caches: only the new positions are processed, and the returned
+        logits and context cover those new positions only. Call `reset_cache()` before a new sequence.
+
         Args:
             s1_ids (torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
             s2_ids (torch.Tensor): Input tensor of s2 token IDs. Shape: [batch_size, seq_len]
             stamp (torch.Tensor, optional): Temporal stamp tensor. Shape: [batch_size, seq_len]. Defaults to None.
             padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            use_cache (bool, optional): Whether to decode incrementally on top of the key/value caches. Defaults to False.
+            time_embedding (torch.Tensor, optional): Precomputed `time_emb(stamp)`, used instead of `stamp`.
+                                                     Shape: [batch_size, seq_len, d_model]. Defaults to None.
 
         Returns:
             Tuple[torch.Tensor, torch.Tensor]:
@@ -378,37 +491,46 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
                 - context: Context representation from the Transformer. Shape: [batch_size, seq_len, d_model]
         """
         x = self.embedding([s1_ids, s2_ids])
-        if stamp is not None:
+        if time_embedding is None and stamp is not None:
             time_embedding = self.time_emb(stamp)
+        if time_embedding is not None:
             x = x + time_embedding
         x = self.token_drop(x)
 
         for layer in self.transformer:
-            x = layer(x, key_padding_mask=padding_mask)
+            x = layer(x, key_padding_mask=padding_mask, use_cache=use_cache)
 
         x = self.norm(x)
 
         s1_logits = self.head(x)
         return s1_logits, x
 
-    def decode_s2(self, context, s1_ids, padding_mask=None):
+    def decode_s2(self, context, s1_ids, padding_mask=None, use_cache=False):
         """
         Decodes the s2 tokens, conditioned on the context and s1 tokens.
 
         This method decodes s2 tokens based on a pre-computed context representation (typically from `decode_s1`)
         and the s1 token IDs. It uses the dependency-aware layer and the conditional s2 head to predict s2 tokens.
 
+        With `use_cache=True`, `context` only holds the positions new since the last call (as returned by a
+        cached `decode_s1`). They are appended to the cross-attention cache and the s2 logits are computed
+        for the final query positions only, against the whole cached context.
+
         Args:
             context (torch.Tensor): Context representation from the transformer (output of decode_s1).
                                      Shape: [batch_size, seq_len, d_model]
             s1_ids (torch.torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
             padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            use_cache (bool, optional): Whether to decode incrementally on top of the cached context. Defaults to False.
 
         Returns:
             torch.Tensor: s2 logits. Shape: [batch_size, seq_len, s2_vocab_size]
+                          ([batch_size, s1_len, s2_vocab_size] with use_cache=True)
         """
         sibling_embed = self.embedding.emb_s1(s1_ids)
-        x2 = self.dep_layer(context, sibling_embed, key_padding_mask=padding_mask)
+        x2 = self.dep_layer(
+            context, sibling_embed, key_padding_mask=padding_mask, use_cache=use_cache
+        )
         return self.head.cond_forward(x2)
 
 
@@ -457,9 +579,16 @@ def top_k_top_p_filtering(
 
 
 def sample_from_logits(
-    logits, temperature=1.0, top_k=None, top_p=None, sample_logits=True
+    logits,
+    temperature=1.0,
+    top_k=None,
+    top_p=None,
+    sample_logits=True,
+    generator=None,
+    block_sizes=None,
 ):
-    logits = logits / temperature
+    # sample in fp32 even when the model runs in reduced precision
+    logits = logits.float() / temperature
     if top_k is not None or top_p is not None:
         if top_k > 0 or top_p < 1.0:
             logits = top_k_top_p_filtering(logits, top_k=top_k, top_p=top_p)
@@ -468,12 +597,144 @@ def sample_from_logits(
 
     if not sample_logits:
         _, x = top_k(probs, k=1, dim=-1)
+    elif isinstance(generator, (list, tuple)):
+        # one generator per block of consecutive rows (the sample paths of one series),
+        # of `block_sizes` rows or equal blocks
+        if block_sizes is None:
+            blocks = probs.view(len(generator), -1, probs.size(-1))
+        else:
+            blocks = probs.split(block_sizes)
+        x = torch.cat(
+            [
+                torch.multinomial(block, num_samples=1, generator=g)
+                for block, g in zip(blocks, generator)
+            ]
+        )
     else:
-        x = torch.multinomial(probs, num_samples=1)
+        x = torch.multinomial(probs, num_samples=1, generator=generator)
 
     return x
 
 
+def series_seeds(seed, num_series):
+    """
+    Per-series sampling seeds, derived from `seed` and the index of each series.
+
+    Every series then samples from a generator of its own, so its paths neither repeat the draws
+    of the other series nor change with how a batch is split into micro-batches or shards.
+    A sequence is taken as per-series seeds already; None stays None.
+    """
+    if seed is None:
+        return None
+    if np.ndim(seed):
+        seeds = np.asarray(seed, dtype=np.int64)
+        if len(seeds) != num_series:
+            raise ValueError(
+                f"Expected {num_series} per-series seeds, got {len(seeds)}."
+            )
+        return seeds
+    children = np.random.SeedSequence(seed).spawn(num_series)
+    return np.array([child.generate_state(1)[0] for child in children], dtype=np.int64)
+
+
+def cache_layers(tokenizer, model):
+    """
+    The attention layers whose key/value caches make up the state of a prompt, by stage.
+
+    Returns:
+        dict: "encoder" and "decoder" (tokenizer) and "model" -> list of (attention module, rotated),
+              where `rotated` tells whether the cached keys carry rotary positions.
+    """
+    return {
+        "encoder": [(layer.self_attn, True) for layer in tokenizer.encoder],
+        "decoder": [(layer.self_attn, True) for layer in tokenizer.decoder],
+        "model": [(layer.self_attn, True) for layer in model.transformer]
+        + [(model.dep_layer.cross_attn, False)],
+    }
+
+
+def capture_caches(layers, rows=slice(None)):
+    """Copies the cached keys and values of `layers`, keeping the batch rows `rows`."""
+    return [
+        (attn.kv_cache.keys[rows].clone(), attn.kv_cache.values[rows].clone())
+        for attn, _ in layers
+    ]
+
+
+def _subset_sampling(sampling, index):
+    """The sampling arguments of the series `index`, slicing the per-series seeds and counts."""
+    sampling = dict(sampling)
+    for name in ("seed", "sample_count"):
+        if np.ndim(sampling[name]):
+            sampling[name] = np.asarray(sampling[name])[index]
+    return sampling
+
+
+def _path_blocks(paths, sample_count):
+    """Splits `generate(average=False)` output into the (sample_count, ...) paths of every series."""
+    if np.ndim(sample_count):
+        return np.split(paths, np.cumsum(sample_count)[:-1], axis=0)
+    return list(paths)
+
+
+def _slice_caches(caches, row, start):
+    """The per-stage caches of one batch row, from position `start` on."""
+    return {
+        stage: [
+            (k[row : row + 1, :, start:].clone(), v[row : row + 1, :, start:].clone())
+            for k, v in layers
+        ]
+        for stage, layers in caches.items()
+    }
+
+
+class PrefixState:
+    """
+    The cached prompt of one series, reusable as the prefix of its next prediction.
+
+    Holds, for every layer of `cache_layers`, the [1, n_heads, length, head_dim] keys and values of
+    the prompt positions, with keys rotated as if the prompt started at position `offset`. The
+    normalization anchor and the raw bars the caches were computed from are kept along, so a
+    later window can be checked against them.
+    """
+
+    def __init__(self, caches, offset, mean, std, timestamps, rows):
+        self.caches = caches
+        self.offset = offset
+        self.mean = mean
+        self.std = std
+        self.timestamps = timestamps
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+def load_prefix_states(tokenizer, model, states, keep):
+    """
+    Loads the first `keep[b]` positions of `states[b]` into the caches of the tokenizer and model.
+
+    The prefixes are right-aligned (left-padded) to their longest length, which is returned; keys
+    are re-rotated to their new positions, so relative positions are unchanged.
+    """
+    prefix_len = max(keep)
+    for stage, layers in cache_layers(tokenizer, model).items():
+        for index, (attn, rotated) in enumerate(layers):
+            like = states[0].caches[stage][index][0]
+            keys = like.new_zeros(len(states), like.size(1), prefix_len, like.size(3))
+            values = torch.zeros_like(keys)
+            for row, (state, length) in enumerate(zip(states, keep)):
+                k, v = state.caches[stage][index]
+                k, v = k[:, :, :length], v[:, :, :length]
+                start = prefix_len - length
+                if rotated and start != state.offset:
+                    k = attn.rotary.shift(k, start - state.offset)
+                keys[row, :, start:] = k[0]
+                values[row, :, start:] = v[0]
+            attn.kv_cache.load(keys, values)
+    return prefix_len
+
+
 def auto_regressive_inference(
     tokenizer,
     model,
@@ -488,93 +749,414 @@ def auto_regressive_inference(
     top_p=0.99,
     sample_count=5,
     verbose=False,
+    average=True,
+    decode_len=None,
+    padding_mask=None,
+    prefix_len=0,
+    state_out=None,
+    seed=None,
 ):
+    """
+    Autoregressively samples `pred_len` steps after `x` for `sample_count` paths per series.
+
+    Series of different lengths are passed left-padded to a common length, with `padding_mask`
+    ([batch_size, seq_len], True marks padding) so that no position attends to the padding.
+
+    With `prefix_len`, `x` continues a prompt of `prefix_len` positions whose key/value caches were
+    loaded with `load_prefix_states`; seq_len then counts the prefix as well, and `padding_mask` covers
+    it. If `state_out` is a dict, the prompt caches of every series are stored in it by stage (see
+    `cache_layers`), so they can serve as the prefix of a later call. Both need the whole sequence,
+    prompt and prediction, to fit into `max_context`.
+
+    With a `seed`, sampling draws from its own generator seeded with it, so the same inputs give
+    the same paths regardless of the global torch RNG. A sequence of per-series seeds (see
+    `series_seeds`) gives every series a generator of its own.
+
+    `sample_count` may also be a sequence with the number of paths of every series; the paths
+    are still fanned out after the prompt has run once per series.
+
+    Returns the decoded window as a NumPy array: the mean over the sample paths,
+    [batch_size, seq_len, d_in], or every path, [batch_size, sample_count, seq_len, d_in],
+    when `average` is False. With per-series sample counts the paths come as
+    [sum(sample_count), seq_len, d_in], those of each series in consecutive rows. With
+    `decode_len` only the last `decode_len` positions of the window are reconstructed, so
+    seq_len == decode_len.
+    """
     with torch.no_grad():
         batch_size = x.size(0)
-        initial_seq_len = x.size(1)
+        initial_seq_len = prefix_len + x.size(1)
         x = torch.clip(x, -clip, clip)
 
         device = x.device
-        x = (
-            x.unsqueeze(1)
-            .repeat(1, sample_count, 1, 1)
-            .reshape(-1, x.size(1), x.size(2))
-            .to(device)
-        )
-        x_stamp = (
-            x_stamp.unsqueeze(1)
-            .repeat(1, sample_count, 1, 1)
-            .reshape(-1, x_stamp.size(1), x_stamp.size(2))
-            .to(device)
-        )
-        y_stamp = (
-            y_stamp.unsqueeze(1)
-            .repeat(1, sample_count, 1, 1)
-            .reshape(-1, y_stamp.size(1), y_stamp.size(2))
-            .to(device)
+        counts = None
+        if np.ndim(sample_count):
+            # per-series sample counts; every repeat_interleave below fans out by them
+            counts = np.asarray(sample_count, dtype=np.int64)
+            if counts.shape != (batch_size,) or counts.min() < 1:
+                raise ValueError(
+                    f"Expected a positive sample count for each of the {batch_size} series, got {counts}."
+                )
+            sample_count = torch.from_numpy(counts).to(device)
+            n_paths = int(counts.sum())
+            first_rows = torch.from_numpy(np.cumsum(counts) - counts).to(device)
+        else:
+            n_paths = batch_size * sample_count
+            first_rows = slice(None, None, sample_count)
+        total_len = initial_seq_len + pred_len
+        if (prefix_len or state_out is not None) and total_len > max_context:
+            raise ValueError(
+                f"Prefix caching needs the whole sequence ({total_len}) within max_context={max_context}."
+            )
+        layers = cache_layers(tokenizer, model)
+        generator = None
+        if seed is not None and np.ndim(seed):
+            generator = [
+                torch.Generator(device=device).manual_seed(int(s)) for s in seed
+            ]
+        elif seed is not None:
+            generator = torch.Generator(device=device).manual_seed(seed)
+
+        # Each series is tokenized once; the sample paths are fanned out afterwards.
+        # Row b * sample_count + s holds sample s of series b (the paths of a series are
+        # consecutive rows with per-series counts as well).
+        if not prefix_len:
+            tokenizer.reset_cache()
+        prompt_token = tokenizer.encode(
+            x,
+            half=True,
+            padding_mask=padding_mask,
+            use_cache=prefix_len > 0 or state_out is not None,
         )
+        if state_out is not None:
+            state_out["encoder"] = capture_caches(layers["encoder"])
+
+        # Padding mask of every path over the whole horizon; the predicted positions
+        # are never padding. None keeps the unmasked attention path for even batches.
+        pad_buf = None
+        if padding_mask is not None:
+            padding_mask = padding_mask.to(device=device, dtype=torch.bool)
+            pad_buf = torch.zeros(n_paths, total_len, dtype=torch.bool, device=device)
+            pad_buf[:, :initial_seq_len] = padding_mask.repeat_interleave(
+                sample_count, dim=0
+            )
 
-        x_token = tokenizer.encode(x, half=True)
-
-        def get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, pred_step):
-
-            if current_seq_len <= max_context - pred_step:
-                return torch.cat([x_stamp, y_stamp[:, :pred_step, :]], dim=1)
-            else:
-                start_idx = max_context - pred_step
-                return torch.cat(
-                    [x_stamp[:, -start_idx:, :], y_stamp[:, :pred_step, :]], dim=1
-                )
+        def path_mask(positions):
+            return None if pad_buf is None else pad_buf[:, positions]
+
+        # Fixed-capacity token buffer for the whole horizon, written in place; the
+        # model only ever sees views of it.
+        # (The tokens of a cached prefix are never read again.)
+        token_buf = torch.zeros(2, n_paths, total_len, dtype=torch.long, device=device)
+        token_buf[:, :, prefix_len:initial_seq_len] = torch.stack(
+            prompt_token
+        ).repeat_interleave(sample_count, dim=1)
+        # The stamps of the whole horizon are known up front: embed them once per
+        # series and hand each step its slice. They start after the cached prefix.
+        stamp_emb = model.time_emb(
+            torch.cat([x_stamp.to(device), y_stamp.to(device)], dim=1)
+        )
 
         for i in trange(pred_len, disable=True):
             current_seq_len = initial_seq_len + i
 
             if current_seq_len <= max_context:
-                input_tokens = x_token
+                # Incremental decoding: the first step prefills the caches with each
+                # series once and broadcasts them to its sample paths, later steps
+                # only feed the token sampled last step.
+                if i == 0:
+                    s1_logits, context = model.prefill(
+                        prompt_token[0],
+                        prompt_token[1],
+                        padding_mask=padding_mask,
+                        repeats=sample_count,
+                        capacity=min(total_len, max_context),
+                        time_embedding=stamp_emb[:, : x.size(1)],
+                        keep_prefix=prefix_len > 0,
+                    )
+                else:
+                    step = slice(current_seq_len - 1, current_seq_len)
+                    stamp_step = current_seq_len - 1 - prefix_len
+                    s1_logits, context = model.decode_s1(
+                        token_buf[0, :, step],
+                        token_buf[1, :, step],
+                        padding_mask=path_mask(slice(0, current_seq_len)),
+                        use_cache=True,
+                        time_embedding=stamp_emb[
+                            :, stamp_step : stamp_step + 1
+                        ].repeat_interleave(sample_count, dim=0),
+                    )
             else:
-                input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-
-            current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
-
-            s1_logits, context = model.decode_s1(
-                input_tokens[0], input_tokens[1], current_stamp
-            )
+                # The window rolls past max_context, so every position shifts and the
+                # cached keys are stale: recompute the whole window.
+                model.reset_cache()
+                window = slice(current_seq_len - max_context, current_seq_len)
+                s1_logits, context = model.decode_s1(
+                    token_buf[0, :, window],
+                    token_buf[1, :, window],
+                    padding_mask=path_mask(window),
+                    time_embedding=stamp_emb[:, window].repeat_interleave(
+                        sample_count, dim=0
+                    ),
+                )
             s1_logits = s1_logits[:, -1, :]
             sample_pre = sample_from_logits(
-                s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True
+                s1_logits,
+                temperature=T,
+                top_k=top_k,
+                top_p=top_p,
+                sample_logits=True,
+                generator=generator,
+                block_sizes=None if counts is None else counts.tolist(),
             )
 
-            s2_logits = model.decode_s2(context, sample_pre)
+            # s2 logits for the final position only, against the cached context
+            # (refilled with the whole window after a full recompute)
+            s2_logits = model.decode_s2(
+                context,
+                sample_pre,
+                padding_mask=path_mask(
+                    slice(max(0, current_seq_len - max_context), current_seq_len)
+                ),
+                use_cache=True,
+            )
+            if i == 0 and state_out is not None:
+                # the caches now hold the whole prompt (and nothing sampled yet)
+                state_out["model"] = capture_caches(layers["model"], first_rows)
             s2_logits = s2_logits[:, -1, :]
             sample_post = sample_from_logits(
-                s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True
+                s2_logits,
+                temperature=T,
+                top_k=top_k,
+                top_p=top_p,
+                sample_logits=True,
+                generator=generator,
+                block_sizes=None if counts is None else counts.tolist(),
             )
 
-            x_token[0] = torch.cat([x_token[0], sample_pre], dim=1)
-            x_token[1] = torch.cat([x_token[1], sample_post], dim=1)
-
-        input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-        z = tokenizer.decode(input_tokens, half=True)
+            token_buf[0, :, current_seq_len] = sample_pre[:, 0]
+            token_buf[1, :, current_seq_len] = sample_post[:, 0]
+
+        # The decoded window is the last max_context tokens. Its history part is the
+        # same for every sample path, so it runs through the decoder once per series
+        # and only the sampled tokens are decoded per path on top of that state.
+        window_start = max(0, initial_seq_len + pred_len - max_context)
+        window_len = initial_seq_len + pred_len - window_start
+        decode_len = window_len if decode_len is None else min(decode_len, window_len)
+
+        if not prefix_len:
+            tokenizer.reset_cache()
+        if window_start < initial_seq_len:
+            z_prefix = tokenizer.decode(
+                [t[:, max(0, window_start - prefix_len) :] for t in prompt_token],
+                half=True,
+                use_cache=True,
+                tail=min(max(0, decode_len - pred_len), x.size(1)),
+                padding_mask=(
+                    None if padding_mask is None else padding_mask[:, window_start:]
+                ),
+            )
+            if state_out is not None:
+                state_out["decoder"] = capture_caches(layers["decoder"])
+            tokenizer.repeat_cache(sample_count, capacity=window_len)
+            z = tokenizer.decode(
+                token_buf[:, :, initial_seq_len:],
+                half=True,
+                use_cache=True,
+                tail=min(decode_len, pred_len),
+                padding_mask=path_mask(slice(window_start, total_len)),
+            )
+            if z_prefix.size(1) > 0:
+                z_prefix = z_prefix.repeat_interleave(sample_count, dim=0)
+                z = torch.cat([z_prefix, z], dim=1)
+        else:
+            z = tokenizer.decode(
+                token_buf[:, :, window_start:], half=True, tail=decode_len
+            )
+        tokenizer.reset_cache()
+        if counts is not None:
+            preds = z.float().cpu().numpy()
+            if average:
+                starts = np.cumsum(counts) - counts
+                preds = np.add.reduceat(preds, starts, axis=0) / counts[:, None, None]
+            return preds
         z = z.reshape(batch_size, sample_count, z.size(1), z.size(2))
-        preds = z.cpu().numpy()
-        preds = np.mean(preds, axis=1)
+        preds = z.float().cpu().numpy()
+        if average:
+            preds = np.mean(preds, axis=1)
 
         return preds
 
 
+def calc_time_features(timestamps, unit="ms"):
+    """
+    Vectorized (minute, hour, weekday, day, month) features of a timestamp array.
+
+    Args:
+        timestamps (np.ndarray): datetime64 array, or int64 epoch values in `unit`.
+        unit (str): Epoch unit of integer input ("s", "ms", "us" or "ns"). Defaults to "ms" (OKX candles).
+
+    Returns:
+        np.ndarray: float32 array of shape (N, 5), matching the `.dt` accessors used by `calc_time_stamps`.
+    """
+    ts = np.asarray(timestamps)
+    if not np.issubdtype(ts.dtype, np.datetime64):
+        ts = ts.astype(np.int64).astype(f"datetime64[{unit}]")
+    minutes = ts.astype("datetime64[m]").astype(np.int64)
+    days = ts.astype("datetime64[D]")
+    months = ts.astype("datetime64[M]")
+
+    features = np.empty((ts.shape[0], 5), dtype=np.float32)
+    features[:, 0] = minutes % 60
+    features[:, 1] = (minutes // 60) % 24
+    features[:, 2] = (days.astype(np.int64) + 3) % 7  # 1970-01-01 is a Thursday
+    features[:, 3] = (days - months.astype("datetime64[D]")).astype(np.int64) + 1
+    features[:, 4] = months.astype(np.int64) % 12 + 1
+    return features
+
+
+def timestamp_features(x_timestamp):
+    """`calc_time_features` of a pandas Series/DatetimeIndex, using wall-clock time for tz-aware input."""
+    index = pd.DatetimeIndex(x_timestamp)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return calc_time_features(index.values)
+
+
+def epoch_ms(timestamps):
+    """int64 epoch milliseconds of a pandas Series/DatetimeIndex (wall-clock time if tz-aware),
+    a datetime64 array, or an int64 array already in milliseconds."""
+    if isinstance(timestamps, np.ndarray):
+        if np.issubdtype(timestamps.dtype, np.datetime64):
+            return timestamps.astype("datetime64[ms]").astype(np.int64)
+        return timestamps.astype(np.int64, copy=False)
+    index = pd.DatetimeIndex(timestamps)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.values.astype("datetime64[ms]").astype(np.int64)
+
+
 def calc_time_stamps(x_timestamp):
-    time_df = pd.DataFrame()
-    time_df["minute"] = x_timestamp.dt.minute
-    time_df["hour"] = x_timestamp.dt.hour
-    time_df["weekday"] = x_timestamp.dt.weekday
-    time_df["day"] = x_timestamp.dt.day
-    time_df["month"] = x_timestamp.dt.month
+    time_df = pd.DataFrame(
+        timestamp_features(x_timestamp).astype(np.int32),
+        columns=["minute", "hour", "weekday", "day", "month"],
+    )
     return time_df
 
 
+# Inference precisions supported by KronosPredictor:
+# "fp32": full precision.
+# "bf16": bf16 weights (half the memory) and bf16 autocast.
+# "int8-dynamic": nn.Linear weights quantized to int8, activations quantized on the fly (CPU only).
+PRECISIONS = ("fp32", "bf16", "int8-dynamic")
+
+
+def apply_precision(module, precision):
+    """Converts `module` in place to the given inference precision and returns it."""
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown precision {precision!r}, expected one of {PRECISIONS}"
+        )
+    if precision == "bf16":
+        module = module.to(torch.bfloat16)
+    elif precision == "int8-dynamic":
+        module = torch.ao.quantization.quantize_dynamic(
+            module, {nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return module
+
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def load_safetensors_mmap(path):
+    """
+    Memory-maps a .safetensors file and returns its tensors as zero-copy views of the mapping.
+
+    The mapping is private (copy-on-write), so the file is never modified; pages are only read
+    from disk (or the page cache) when a tensor is first touched.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_len,) = struct.unpack("<Q", buf[:8])
+    header = json.loads(buf[8 : 8 + header_len])
+    header.pop("__metadata__", None)
+    data_start = 8 + header_len
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        count = (end - start) // dtype.itemsize
+        if count:
+            tensor = torch.frombuffer(
+                buf, dtype=dtype, count=count, offset=data_start + start
+            )
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+
+def load_pretrained(cls, path, mmap_weights=True):
+    """
+    Loads a `Kronos`/`KronosTokenizer` checkpoint directory (config.json + model.safetensors).
+
+    With `mmap_weights` the parameters are assigned straight from the memory-mapped file instead
+    of being copied into freshly initialized ones. Falls back to `cls.from_pretrained` for other
+    checkpoint layouts (e.g. a hub repo id).
+    """
+    weights_path = os.path.join(path, "model.safetensors")
+    if not mmap_weights or not os.path.isfile(weights_path):
+        return cls.from_pretrained(path)
+    with open(os.path.join(path, "config.json")) as f:
+        module = cls(**json.load(f))
+    # strict=False, as in PyTorchModelHubMixin
+    module.load_state_dict(
+        load_safetensors_mmap(weights_path), strict=False, assign=True
+    )
+    return module.eval()
+
+
+def module_nbytes(module):
+    """Resident size of a module's weights and buffers in bytes, including packed int8 weights."""
+
+    def nbytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(v) for v in module.state_dict().values())
+
+
+NORM_ANCHORS = ("window", "anchored")
+
+
 class KronosPredictor:
 
-    def __init__(self, model, tokenizer, device="cpu", max_context=512, clip=5):
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device="cpu",
+        max_context=512,
+        clip=5,
+        precision="fp32",
+        norm_anchor="window",
+        anchor_max_len=None,
+    ):
         self.tokenizer = tokenizer
         self.model = model
         self.max_context = max_context
@@ -584,13 +1166,70 @@ class KronosPredictor:
         self.amt_vol = "amount"
         self.time_cols = ["minute", "hour", "weekday", "day", "month"]
         self.device = device
+        self.precision = precision
+        self.shard_pool = None  # optional process pool, see core.kronos.infer.sharding
+        # "window": normalize every call by its own window; "anchored": keep the statistics of
+        # the first window of a keyed series, so its cached prompt stays valid (see predict_paths)
+        self.norm_anchor = norm_anchor
+        self.anchor_max_len = anchor_max_len
+        self.prefix_states = {}
+        self.prediction_cache = None  # optional, see core.kronos.infer.cache
+
+        if precision == "int8-dynamic" and torch.device(device).type != "cpu":
+            raise ValueError("int8-dynamic precision is only supported on CPU.")
+        if norm_anchor not in NORM_ANCHORS:
+            raise ValueError(
+                f"Unknown norm_anchor {norm_anchor!r}, expected one of {NORM_ANCHORS}"
+            )
 
         self.tokenizer = self.tokenizer.to(self.device)
         self.model = self.model.to(self.device)
+        # fold the token embedding projection into lookup tables (in full precision)
+        self.model.embedding.fuse_tables()
+
+        self.tokenizer = apply_precision(self.tokenizer, precision)
+        self.model = apply_precision(self.model, precision)
 
     def generate(
-        self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose
+        self,
+        x,
+        x_stamp,
+        y_stamp,
+        pred_len,
+        T,
+        top_k,
+        top_p,
+        sample_count,
+        verbose,
+        average=True,
+        decode_len=None,
+        padding_mask=None,
+        prefix_len=0,
+        state_out=None,
+        seed=None,
     ):
+        """Runs autoregressive inference on normalized arrays; only the last `decode_len`
+        (default `pred_len`) predicted steps are decoded and returned. Left-padded batches
+        pass their `padding_mask` (B, seq_len), True marking padding. `prefix_len`, `state_out`
+        and `seed` are passed on to `auto_regressive_inference`."""
+        if decode_len is None:
+            decode_len = pred_len
+        if self.shard_pool is not None:
+            return self.shard_pool.generate(
+                x,
+                x_stamp,
+                y_stamp,
+                pred_len,
+                T,
+                top_k,
+                top_p,
+                sample_count,
+                verbose,
+                average=average,
+                decode_len=decode_len,
+                padding_mask=padding_mask,
+                seed=seed,
+            )
 
         x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device)
         x_stamp_tensor = torch.from_numpy(np.array(x_stamp).astype(np.float32)).to(
@@ -599,24 +1238,65 @@ class KronosPredictor:
         y_stamp_tensor = torch.from_numpy(np.array(y_stamp).astype(np.float32)).to(
             self.device
         )
+        if padding_mask is not None:
+            padding_mask = torch.from_numpy(np.array(padding_mask, dtype=bool)).to(
+                self.device
+            )
+
+        with torch.autocast(
+            device_type=torch.device(self.device).type,
+            dtype=torch.bfloat16,
+            enabled=self.precision == "bf16",
+        ):
+            preds = auto_regressive_inference(
+                self.tokenizer,
+                self.model,
+                x_tensor,
+                x_stamp_tensor,
+                y_stamp_tensor,
+                self.max_context,
+                pred_len,
+                self.clip,
+                T,
+                top_k,
+                top_p,
+                sample_count,
+                verbose,
+                average,
+                decode_len,
+                padding_mask,
+                prefix_len,
+                state_out,
+                seed,
+            )
+        return preds
+
+    def warm_up(self, seq_len=64, pred_len=2, sample_count=1):
+        """
+        Runs one small synthetic prediction, so the weights are paged in and the kernels, rotary
+        tables and attention masks are initialized before the first real request.
 
-        preds = auto_regressive_inference(
-            self.tokenizer,
-            self.model,
-            x_tensor,
-            x_stamp_tensor,
-            y_stamp_tensor,
-            self.max_context,
+        Returns:
+            float: Seconds the warm-up took.
+        """
+        start = time.perf_counter()
+        stamps = timestamp_features(
+            pd.date_range("2024-01-01", periods=seq_len + pred_len, freq="5min")
+        )
+        x = np.zeros((1, seq_len, len(self.price_cols) + 2), dtype=np.float32)
+        self.generate(
+            x,
+            stamps[np.newaxis, :seq_len],
+            stamps[np.newaxis, seq_len:],
             pred_len,
-            self.clip,
-            T,
-            top_k,
-            top_p,
+            1.0,
+            0,
+            0.9,
             sample_count,
-            verbose,
+            False,
+            decode_len=1,
         )
-        preds = preds[:, -pred_len:, :]
-        return preds
+        return time.perf_counter() - start
 
     def predict(
         self,
@@ -649,12 +1329,9 @@ class KronosPredictor:
                 "Input DataFrame contains NaN values in price or volume columns."
             )
 
-        x_time_df = calc_time_stamps(x_timestamp)
-        y_time_df = calc_time_stamps(y_timestamp)
-
         x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(np.float32)
-        x_stamp = x_time_df.values.astype(np.float32)
-        y_stamp = y_time_df.values.astype(np.float32)
+        x_stamp = timestamp_features(x_timestamp)
+        y_stamp = timestamp_features(y_timestamp)
 
         x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
 
@@ -679,35 +1356,17 @@ class KronosPredictor:
         )
         return pred_df
 
-    def predict_batch(
-        self,
-        df_list,
-        x_timestamp_list,
-        y_timestamp_list,
-        pred_len,
-        T=1.0,
-        top_k=0,
-        top_p=0.9,
-        sample_count=1,
-        verbose=True,
-    ):
+    def _load_series(self, df_list, x_timestamp_list, y_timestamp_list, pred_len):
         """
-        Perform parallel (batch) prediction on multiple time series. All series must have the same historical length and prediction length (pred_len).
+        Validates the inputs of a batch prediction.
 
-        Args:
-            df_list (List[pd.DataFrame]): List of input DataFrames, each containing price columns and optional volume/amount columns.
-            x_timestamp_list (List[pd.DatetimeIndex or Series]): List of timestamps corresponding to historical data, length should match the number of rows in each DataFrame.
-            y_timestamp_list (List[pd.DatetimeIndex or Series]): List of future prediction timestamps, length should equal pred_len.
-            pred_len (int): Number of prediction steps.
-            T (float): Sampling temperature.
-            top_k (int): Top-k filtering threshold.
-            top_p (float): Top-p (nucleus sampling) threshold.
-            sample_count (int): Number of parallel samples per series, automatically averaged internally.
-            verbose (bool): Whether to display autoregressive progress.
+        Besides DataFrames, every series may be given as a NumPy array (seq_len, 6) in `open, high, low,
+        close, volume, amount` order, with timestamps as int64 epoch milliseconds or datetime64 arrays
+        (e.g. views of a `CandleRingBuffer`); these never go through pandas.
 
         Returns:
-            List[pd.DataFrame]: List of prediction results in the same order as input, each DataFrame contains
-                                `open, high, low, close, volume, amount` columns, indexed by corresponding `y_timestamp`.
+            Tuple: (x_list, x_stamp_list, y_stamp_list) of per-series float32 arrays: the raw features
+                   (seq_len, feat) and the time features (seq_len, time_feat) and (pred_len, time_feat).
         """
         # Basic validation
         if (
@@ -728,43 +1387,20 @@ class KronosPredictor:
         x_list = []
         x_stamp_list = []
         y_stamp_list = []
-        means = []
-        stds = []
-        seq_lens = []
-        y_lens = []
 
         for i in range(num_series):
             df = df_list[i]
-            if not isinstance(df, pd.DataFrame):
-                raise ValueError(f"Input at index {i} is not a pandas DataFrame.")
-            if not all(col in df.columns for col in self.price_cols):
-                raise ValueError(
-                    f"DataFrame at index {i} is missing price columns {self.price_cols}."
-                )
-
-            df = df.copy()
-            if self.vol_col not in df.columns:
-                df[self.vol_col] = 0.0
-                df[self.amt_vol] = 0.0
-            if self.amt_vol not in df.columns and self.vol_col in df.columns:
-                df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
-
-            if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
-                raise ValueError(
-                    f"DataFrame at index {i} contains NaN values in price or volume columns."
-                )
-
             x_timestamp = x_timestamp_list[i]
             y_timestamp = y_timestamp_list[i]
 
-            x_time_df = calc_time_stamps(x_timestamp)
-            y_time_df = calc_time_stamps(y_timestamp)
-
-            x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(
-                np.float32
-            )
-            x_stamp = x_time_df.values.astype(np.float32)
-            y_stamp = y_time_df.values.astype(np.float32)
+            if isinstance(df, np.ndarray):
+                x = self._array_values(df, i)
+                x_stamp = calc_time_features(x_timestamp)
+                y_stamp = calc_time_features(y_timestamp)
+            else:
+                x = self._frame_values(df, i)
+                x_stamp = timestamp_features(x_timestamp)
+                y_stamp = timestamp_features(y_timestamp)
 
             if x.shape[0] != x_stamp.shape[0]:
                 raise ValueError(
@@ -775,58 +1411,746 @@ class KronosPredictor:
                     f"y_timestamp length at index {i} should equal pred_len={pred_len}, got {y_stamp.shape[0]}."
                 )
 
-            x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
-            x_norm = (x - x_mean) / (x_std + 1e-5)
-            x_norm = np.clip(x_norm, -self.clip, self.clip)
+            x_list.append(x)
+            x_stamp_list.append(x_stamp.astype(np.float32))
+            y_stamp_list.append(y_stamp.astype(np.float32))
 
-            x_list.append(x_norm)
-            x_stamp_list.append(x_stamp)
-            y_stamp_list.append(y_stamp)
-            means.append(x_mean)
-            stds.append(x_std)
+        # Histories may differ in length (they are left-padded), predictions may not
+        y_lens = [len(y_stamp) for y_stamp in y_stamp_list]
+        if len(set(y_lens)) > 1:
+            raise ValueError(
+                f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}"
+            )
+        seq_lens = [len(x) for x in x_list]
+        if seq_lens and min(seq_lens) == 0:
+            raise ValueError(
+                f"Every series needs at least one historical row, got: {seq_lens}"
+            )
+        return x_list, x_stamp_list, y_stamp_list
 
-            seq_lens.append(x_norm.shape[0])
-            y_lens.append(y_stamp.shape[0])
+    def _array_values(self, values, i):
+        n_features = len(self.price_cols) + 2
+        if values.ndim != 2 or values.shape[1] != n_features:
+            raise ValueError(
+                f"Array at index {i} should have shape (seq_len, {n_features}), got {values.shape}."
+            )
+        x = values.astype(np.float32, copy=False)
+        if not np.isfinite(x).all():
+            raise ValueError(f"Array at index {i} contains NaN or infinite values.")
+        return x
 
-        # Require all series to have consistent historical and prediction lengths for batch processing
-        if len(set(seq_lens)) != 1:
+    def _frame_values(self, df, i):
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(f"Input at index {i} is not a pandas DataFrame.")
+        if not all(col in df.columns for col in self.price_cols):
             raise ValueError(
-                f"Parallel prediction requires all series to have consistent historical lengths, got: {seq_lens}"
+                f"DataFrame at index {i} is missing price columns {self.price_cols}."
             )
-        if len(set(y_lens)) != 1:
+
+        df = df.copy()
+        if self.vol_col not in df.columns:
+            df[self.vol_col] = 0.0
+            df[self.amt_vol] = 0.0
+        if self.amt_vol not in df.columns and self.vol_col in df.columns:
+            df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
+
+        if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
             raise ValueError(
-                f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}"
+                f"DataFrame at index {i} contains NaN values in price or volume columns."
             )
 
-        x_batch = np.stack(x_list, axis=0).astype(np.float32)  # (B, seq_len, feat)
-        x_stamp_batch = np.stack(x_stamp_list, axis=0).astype(
+        return df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(
             np.float32
+        )
+
+    def _normalize(self, x, mean, std):
+        return np.clip((x - mean) / (std + 1e-5), -self.clip, self.clip)
+
+    @staticmethod
+    def _pad_batch(x_list, x_stamp_list):
+        """Left-pads the series to the longest one; returns (x_batch, x_stamp_batch, padding_mask)."""
+        seq_lens = [len(x) for x in x_list]
+        seq_len = max(seq_lens)
+        x_batch = np.zeros(
+            (len(x_list), seq_len, x_list[0].shape[1]), dtype=np.float32
+        )  # (B, seq_len, feat)
+        x_stamp_batch = np.zeros(
+            (len(x_list), seq_len, x_stamp_list[0].shape[1]), dtype=np.float32
         )  # (B, seq_len, time_feat)
+        padding_mask = np.ones((len(x_list), seq_len), dtype=bool)
+        for i, n in enumerate(seq_lens):
+            x_batch[i, seq_len - n :] = x_list[i]
+            x_stamp_batch[i, seq_len - n :] = x_stamp_list[i]
+            padding_mask[i, seq_len - n :] = False
+        if not padding_mask.any():
+            padding_mask = None
+        return x_batch, x_stamp_batch, padding_mask
+
+    def _prepare_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len):
+        """
+        Validates and normalizes the inputs of a batch prediction.
+
+        Series with fewer rows than the longest one are left-padded with zeros to seq_len, the
+        longest history length, and marked in the padding mask.
+
+        Returns:
+            Tuple: (x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask) where the batches
+                   are float32 arrays of shape (B, seq_len, feat), (B, seq_len, time_feat) and
+                   (B, pred_len, time_feat), means/stds are the per-series normalization statistics and
+                   padding_mask is a (B, seq_len) bool array, True at padding, or None if nothing is padded.
+        """
+        x_list, x_stamp_list, y_stamp_list = self._load_series(
+            df_list, x_timestamp_list, y_timestamp_list, pred_len
+        )
+        means = [np.mean(x, axis=0) for x in x_list]
+        stds = [np.std(x, axis=0) for x in x_list]
+        x_batch, x_stamp_batch, padding_mask = self._pad_batch(
+            [self._normalize(x, m, sd) for x, m, sd in zip(x_list, means, stds)],
+            x_stamp_list,
+        )
         y_stamp_batch = np.stack(y_stamp_list, axis=0).astype(
             np.float32
         )  # (B, pred_len, time_feat)
 
-        preds = self.generate(
+        return x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask
+
+    def predict_batch(
+        self,
+        df_list,
+        x_timestamp_list,
+        y_timestamp_list,
+        pred_len,
+        T=1.0,
+        top_k=0,
+        top_p=0.9,
+        sample_count=1,
+        verbose=True,
+        seed=None,
+    ):
+        """
+        Perform parallel (batch) prediction on multiple time series. All series must have the same prediction length (pred_len);
+        histories of different lengths are left-padded and masked, so they run in the same batch.
+
+        Args:
+            df_list (List[pd.DataFrame]): List of input DataFrames, each containing price columns and optional volume/amount columns.
+            x_timestamp_list (List[pd.DatetimeIndex or Series]): List of timestamps corresponding to historical data, length should match the number of rows in each DataFrame.
+            y_timestamp_list (List[pd.DatetimeIndex or Series]): List of future prediction timestamps, length should equal pred_len.
+            pred_len (int): Number of prediction steps.
+            T (float): Sampling temperature.
+            top_k (int): Top-k filtering threshold.
+            top_p (float): Top-p (nucleus sampling) threshold.
+            sample_count (int): Number of parallel samples per series, automatically averaged internally.
+            verbose (bool): Whether to display autoregressive progress.
+            seed (int, optional): Seed of the sampling, for reproducible results. Every series draws
+                                  from its own seed (see `series_seeds`); a sequence gives them
+                                  directly. Seeded calls are answered from `prediction_cache` when
+                                  one is attached.
+
+        Returns:
+            List[pd.DataFrame]: List of prediction results in the same order as input, each DataFrame contains
+                                `open, high, low, close, volume, amount` columns, indexed by corresponding `y_timestamp`.
+        """
+        x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask = (
+            self._prepare_batch(df_list, x_timestamp_list, y_timestamp_list, pred_len)
+        )
+        num_series = len(df_list)
+        seed = series_seeds(seed, num_series)
+
+        def compute():
+            preds = self.generate(
+                x_batch,
+                x_stamp_batch,
+                y_stamp_batch,
+                pred_len,
+                T,
+                top_k,
+                top_p,
+                sample_count,
+                verbose,
+                padding_mask=padding_mask,
+                seed=seed,
+            )
+            # preds: (B, pred_len, feat)
+
+            mean = np.stack(means, axis=0)[:, np.newaxis, :]
+            std = np.stack(stds, axis=0)[:, np.newaxis, :]
+            return preds * (std + 1e-5) + mean
+
+        preds = self._cached(
+            "batch",
+            (x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask),
+            (x_timestamp_list, y_timestamp_list),
+            {"pred_len": pred_len, "T": T, "top_k": top_k, "top_p": top_p},
+            sample_count,
+            seed,
+            compute,
+        )
+        pred_dfs = []
+        for i in range(num_series):
+            pred_df = pd.DataFrame(
+                preds[i],
+                columns=self.price_cols + [self.vol_col, self.amt_vol],
+                index=y_timestamp_list[i],
+            )
+            pred_dfs.append(pred_df)
+        return pred_dfs
+
+    def _cached(self, kind, arrays, timestamps, sampling, sample_count, seed, compute):
+        """
+        Returns `compute()`, through `prediction_cache` when one is attached and the call is seeded
+        (unseeded calls are meant to draw fresh samples). The key covers the normalized inputs and
+        their statistics, the timestamps and every parameter the result depends on.
+        """
+        if self.prediction_cache is None or seed is None:
+            return compute()
+        arrays = list(arrays) + [epoch_ms(ts) for series in timestamps for ts in series]
+        params = {
+            "kind": kind,
+            "sample_count": np.asarray(sample_count).tolist(),
+            "seed": np.asarray(seed).tolist(),
+            "precision": self.precision,
+            "max_context": self.max_context,
+            "clip": self.clip,
+            **sampling,
+        }
+        return self.prediction_cache.get_or_compute(arrays, params, compute)
+
+    def predict_paths(
+        self,
+        df_list,
+        x_timestamp_list,
+        y_timestamp_list,
+        pred_len,
+        T=1.0,
+        top_k=0,
+        top_p=0.9,
+        sample_count=8,
+        verbose=False,
+        last_step_only=False,
+        series_keys=None,
+        seed=None,
+    ):
+        """
+        Sample `sample_count` prediction paths per series, without averaging them.
+
+        Takes the same inputs as `predict_batch`, but each series is passed only once:
+        the sample paths are fanned out inside the model.
+
+        Args:
+            sample_count (int or Sequence[int]): Paths per series, or the number of paths of every series.
+            last_step_only (bool): Only reconstruct the final predicted step of each path, which skips
+                                   the tokenizer decoder work for the intermediate steps.
+            series_keys (List[Hashable], optional): Identity of every series (e.g. the coin). With
+                                   `norm_anchor="anchored"` the prompt caches of each key are kept
+                                   after the call, and the next window of the same key only runs
+                                   its new bars through the model (see `_predict_keyed`).
+            seed (int, optional): Seed of the sampling, as in `predict_batch`. Keyed calls are not
+                                  cached, their result depends on the cached prompts.
+
+        Returns:
+            np.ndarray: De-normalized paths of shape (num_series, sample_count, pred_len, feat),
+                        with features in `open, high, low, close, volume, amount` order.
+                        The pred_len axis has size 1 when `last_step_only` is set. With per-series
+                        sample counts the shape is (sum(sample_count), pred_len, feat), the paths
+                        of each series in consecutive rows.
+        """
+        seed = series_seeds(seed, len(df_list))
+        sampling = {
+            "T": T,
+            "top_k": top_k,
+            "top_p": top_p,
+            "sample_count": sample_count,
+            "verbose": verbose,
+            "seed": seed,
+        }
+        decode_len = 1 if last_step_only else pred_len
+        if (
+            series_keys is not None
+            and self.norm_anchor == "anchored"
+            and self.shard_pool is None
+        ):
+            return self._predict_keyed(
+                series_keys,
+                df_list,
+                x_timestamp_list,
+                y_timestamp_list,
+                pred_len,
+                sampling,
+                decode_len,
+            )
+
+        x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask = (
+            self._prepare_batch(df_list, x_timestamp_list, y_timestamp_list, pred_len)
+        )
+
+        def compute():
+            preds = self.generate(
+                x_batch,
+                x_stamp_batch,
+                y_stamp_batch,
+                pred_len,
+                **sampling,
+                average=False,
+                decode_len=decode_len,
+                padding_mask=padding_mask,
+            )
+            # preds: (B, sample_count, pred_len, feat)
+
+            mean = np.stack(means, axis=0)[:, np.newaxis, np.newaxis, :]
+            std = np.stack(stds, axis=0)[:, np.newaxis, np.newaxis, :]
+            if np.ndim(sample_count):
+                # preds: (sum(sample_count), pred_len, feat)
+                mean = np.repeat(mean[:, 0], sample_count, axis=0)
+                std = np.repeat(std[:, 0], sample_count, axis=0)
+            return preds * (std + 1e-5) + mean
+
+        return self._cached(
+            "paths",
+            (x_batch, x_stamp_batch, y_stamp_batch, means, stds, padding_mask),
+            (x_timestamp_list, y_timestamp_list),
+            {
+                "pred_len": pred_len,
+                "decode_len": decode_len,
+                "T": T,
+                "top_k": top_k,
+                "top_p": top_p,
+            },
+            sample_count,
+            seed,
+            compute,
+        )
+
+    @staticmethod
+    def _match_prefix(state, timestamps, rows):
+        """
+        Aligns a new window with the history of a cached prefix.
+
+        Returns:
+            Tuple[int, int] or None: (start, same) where the window begins at position `start` of the
+                                     state and its first `same` rows equal the cached bars, or None
+                                     if the window does not continue the cached history.
+        """
+        start = int(np.searchsorted(state.timestamps, timestamps[0]))
+        if start >= len(state) or state.timestamps[start] != timestamps[0]:
+            return None
+        overlap = min(len(state) - start, len(timestamps))
+        if not np.array_equal(
+            state.timestamps[start : start + overlap], timestamps[:overlap]
+        ):
+            return None
+        changed = np.flatnonzero(
+            np.any(state.rows[start : start + overlap] != rows[:overlap], axis=1)
+        )
+        return start, int(changed[0]) if changed.size else overlap
+
+    def _predict_keyed(
+        self,
+        series_keys,
+        df_list,
+        x_timestamp_list,
+        y_timestamp_list,
+        pred_len,
+        sampling,
+        decode_len,
+    ):
+        """
+        `predict_paths` that reuses the cached prompt of every series key.
+
+        A series is normalized with the statistics of the window it was first seen with (its anchor),
+        so the cached keys/values of its earlier bars stay valid. When the new window continues the
+        cached history, the unchanged prefix is loaded from `prefix_states` and only the new bars (at
+        least the last one, which may have been an unconfirmed candle) run through the tokenizer and
+        model. The prompt then is the whole history since the anchor. Once it would exceed
+        `anchor_max_len` (or `max_context`), or the history does not match, the series starts over
+        from its current window with fresh statistics.
+
+        The warm series of a call share the number of reprocessed bars, the largest any of them needs.
+        """
+        if len(series_keys) != len(df_list):
+            raise ValueError(
+                f"series_keys has {len(series_keys)} entries for {len(df_list)} series."
+            )
+        x_list, x_stamp_list, y_stamp_list = self._load_series(
+            df_list, x_timestamp_list, y_timestamp_list, pred_len
+        )
+        timestamps = [np.array(epoch_ms(ts)) for ts in x_timestamp_list]
+        limit = min(self.max_context, self.anchor_max_len or self.max_context)
+
+        matches = {}
+        for i, key in enumerate(series_keys):
+            state = self.prefix_states.get(key)
+            if state is not None:
+                match = self._match_prefix(state, timestamps[i], x_list[i])
+                if match is not None:
+                    matches[i] = match
+        new_len = max(
+            [max(1, len(x_list[i]) - same) for i, (_, same) in matches.items()],
+            default=1,
+        )
+        keep = {}
+        for i, (start, same) in matches.items():
+            window = len(x_list[i])
+            length = start + window - new_len
+            if (
+                window >= new_len
+                and window - new_len <= same
+                and length >= 1
+                and length + new_len + pred_len <= limit
+            ):
+                keep[i] = length
+
+        preds = [None] * len(df_list)
+        cold = [i for i in range(len(df_list)) if i not in keep]
+        if cold:
+            self._predict_cold(
+                cold,
+                series_keys,
+                x_list,
+                x_stamp_list,
+                y_stamp_list,
+                timestamps,
+                pred_len,
+                sampling,
+                decode_len,
+                limit,
+                preds,
+            )
+        if keep:
+            self._predict_warm(
+                keep,
+                new_len,
+                series_keys,
+                x_list,
+                x_stamp_list,
+                y_stamp_list,
+                timestamps,
+                pred_len,
+                sampling,
+                decode_len,
+                preds,
+            )
+        if np.ndim(sampling["sample_count"]):
+            return np.concatenate(preds, axis=0)
+        return np.stack(preds, axis=0)
+
+    def _predict_cold(
+        self,
+        index,
+        series_keys,
+        x_list,
+        x_stamp_list,
+        y_stamp_list,
+        timestamps,
+        pred_len,
+        sampling,
+        decode_len,
+        limit,
+        preds,
+    ):
+        means = [np.mean(x_list[i], axis=0) for i in index]
+        stds = [np.std(x_list[i], axis=0) for i in index]
+        x_batch, x_stamp_batch, padding_mask = self._pad_batch(
+            [self._normalize(x_list[i], m, sd) for i, m, sd in zip(index, means, stds)],
+            [x_stamp_list[i] for i in index],
+        )
+        seq_len = x_batch.shape[1]
+        state_out = {} if seq_len + pred_len <= limit else None
+        sampling = _subset_sampling(sampling, index)
+        paths = self.generate(
             x_batch,
             x_stamp_batch,
-            y_stamp_batch,
+            np.stack([y_stamp_list[i] for i in index], axis=0),
+            pred_len,
+            **sampling,
+            average=False,
+            decode_len=decode_len,
+            padding_mask=padding_mask,
+            state_out=state_out,
+        )
+        paths = _path_blocks(paths, sampling["sample_count"])
+        for row, i in enumerate(index):
+            preds[i] = paths[row] * (stds[row] + 1e-5) + means[row]
+            if state_out is None:
+                self.prefix_states.pop(series_keys[i], None)
+            else:
+                pad = seq_len - len(x_list[i])
+                self.prefix_states[series_keys[i]] = PrefixState(
+                    _slice_caches(state_out, row, pad),
+                    pad,
+                    means[row],
+                    stds[row],
+                    timestamps[i],
+                    np.array(x_list[i]),  # may be a view of a live buffer
+                )
+
+    def _predict_warm(
+        self,
+        keep,
+        new_len,
+        series_keys,
+        x_list,
+        x_stamp_list,
+        y_stamp_list,
+        timestamps,
+        pred_len,
+        sampling,
+        decode_len,
+        preds,
+    ):
+        index = list(keep)
+        states = [self.prefix_states[series_keys[i]] for i in index]
+        x_batch = np.stack(
+            [
+                self._normalize(x_list[i][-new_len:], state.mean, state.std)
+                for i, state in zip(index, states)
+            ],
+            axis=0,
+        )
+        prefix_len = load_prefix_states(
+            self.tokenizer, self.model, states, [keep[i] for i in index]
+        )
+        padding_mask = np.zeros((len(index), prefix_len + new_len), dtype=bool)
+        for row, i in enumerate(index):
+            padding_mask[row, : prefix_len - keep[i]] = True
+        state_out = {}
+        sampling = _subset_sampling(sampling, index)
+        paths = self.generate(
+            x_batch,
+            np.stack([x_stamp_list[i][-new_len:] for i in index], axis=0),
+            np.stack([y_stamp_list[i] for i in index], axis=0),
+            pred_len,
+            **sampling,
+            average=False,
+            decode_len=decode_len,
+            padding_mask=padding_mask if padding_mask.any() else None,
+            prefix_len=prefix_len,
+            state_out=state_out,
+        )
+        paths = _path_blocks(paths, sampling["sample_count"])
+        for row, (i, state) in enumerate(zip(index, states)):
+            preds[i] = paths[row] * (state.std + 1e-5) + state.mean
+            pad = prefix_len - keep[i]
+            self.prefix_states[series_keys[i]] = PrefixState(
+                _slice_caches(state_out, row, pad),
+                pad,
+                state.mean,
+                state.std,
+                np.concatenate([state.timestamps[: keep[i]], timestamps[i][-new_len:]]),
+                np.concatenate([state.rows[: keep[i]], x_list[i][-new_len:]]),
+            )
+
+    def predict_distribution(
+        self,
+        df_list,
+        x_timestamp_list,
+        y_timestamp_list,
+        pred_len,
+        T=1.0,
+        top_k=0,
+        top_p=0.9,
+        sample_count=8,
+        quantiles=None,
+        verbose=False,
+        last_step_only=False,
+        series_keys=None,
+        seed=None,
+    ):
+        """
+        Sample prediction paths and summarize the distribution of the predicted close.
+
+        Args:
+            quantiles (Sequence[float], optional): Quantile levels in [0, 1] to compute over the sample paths.
+            sample_count (int): Paths per series. Unlike `predict_paths`, per-series sample counts
+                                are not supported (see `adaptive_distribution`).
+            last_step_only (bool): Only reconstruct the final step, which is all that `prob_up` and
+                                   `mean_return` need.
+            Other arguments are the same as in `predict_paths`.
+
+        Returns:
+            dict: with keys
+                - "paths": (num_series, sample_count, pred_len, feat) array from `predict_paths`.
+                - "last_close": (num_series,) last observed close of each input series.
+                - "prob_up": (num_series,) share of paths whose final close is above `last_close`.
+                - "mean_return": (num_series,) relative change of the mean final close vs `last_close`.
+                - "quantiles": (len(quantiles), num_series, pred_len, feat) array, only if `quantiles` is given.
+                The pred_len axes have size 1 when `last_step_only` is set.
+        """
+        if np.ndim(sample_count):
+            raise ValueError(
+                "predict_distribution takes a single sample_count for all series, "
+                f"got {len(sample_count)} counts."
+            )
+        paths = self.predict_paths(
+            df_list,
+            x_timestamp_list,
+            y_timestamp_list,
             pred_len,
             T,
             top_k,
             top_p,
             sample_count,
             verbose,
+            last_step_only,
+            series_keys,
+            seed,
         )
-        # preds: (B, pred_len, feat)
 
-        pred_dfs = []
-        for i in range(num_series):
-            preds_i = preds[i] * (stds[i] + 1e-5) + means[i]
-            pred_df = pd.DataFrame(
-                preds_i,
-                columns=self.price_cols + [self.vol_col, self.amt_vol],
-                index=y_timestamp_list[i],
-            )
-            pred_dfs.append(pred_df)
+        close_idx = self.price_cols.index("close")
+        last_close = np.array(
+            [
+                (
+                    df[-1, close_idx]
+                    if isinstance(df, np.ndarray)
+                    else df["close"].iloc[-1]
+                )
+                for df in df_list
+            ],
+            dtype=np.float64,
+        )
+        final_close = paths[:, :, -1, close_idx]  # (B, sample_count)
+
+        result = {
+            "paths": paths,
+            "last_close": last_close,
+            "prob_up": np.mean(final_close > last_close[:, np.newaxis], axis=1),
+            "mean_return": (np.mean(final_close, axis=1) - last_close) / last_close,
+        }
+        if quantiles is not None:
+            result["quantiles"] = np.quantile(paths, quantiles, axis=1)
+        return result
+
+    def predict_arrays(
+        self,
+        values_list,
+        timestamps_list,
+        y_timestamps_list,
+        pred_len,
+        sample_count=8,
+        last_step_only=True,
+        **kwargs,
+    ):
+        """
+        NumPy-native `predict_distribution`: nothing on the way to the model goes through pandas.
 
-        return pred_dfs
+        Args:
+            values_list (List[np.ndarray]): (seq_len, 6) arrays in `open, high, low, close, volume, amount`
+                                            order, e.g. `CandleRingBuffer.window` views (they are not modified).
+            timestamps_list (List[np.ndarray]): int64 epoch milliseconds (or datetime64) of every row.
+            y_timestamps_list (List[np.ndarray]): The pred_len future timestamps of every series.
+            **kwargs: Passed on to `predict_distribution` (T, top_k, top_p, series_keys, seed, ...).
+
+        Returns:
+            dict: As `predict_distribution`.
+        """
+        for values in values_list:
+            if not isinstance(values, np.ndarray):
+                raise ValueError(
+                    f"predict_arrays takes NumPy arrays, got {type(values).__name__}."
+                )
+        return self.predict_distribution(
+            list(values_list),
+            list(timestamps_list),
+            list(y_timestamps_list),
+            pred_len,
+            sample_count=sample_count,
+            last_step_only=last_step_only,
+            **kwargs,
+        )
+
+
+def precision_drift_report(
+    model,
+    tokenizer,
+    x=None,
+    x_stamp=None,
+    y_stamp=None,
+    pred_len=28,
+    precisions=("bf16", "int8-dynamic"),
+    sample_count=64,
+    seed=0,
+    device="cpu",
+    max_context=512,
+):
+    """
+    Compares reduced-precision inference against fp32 on a fixed input.
+
+    Each precision runs on its own copy of the fp32 `model` and `tokenizer`, with the same seed.
+    The final-step predicted close of every sample path (in normalized units) is compared with
+    the fp32 paths.
+
+    Args:
+        model (Kronos): fp32 predictor model.
+        tokenizer (KronosTokenizer): fp32 tokenizer.
+        x, x_stamp, y_stamp (np.ndarray, optional): Normalized input of shape (B, seq_len, feat) and stamps
+            as prepared by `KronosPredictor._prepare_batch`. Defaults to a fixed synthetic 5-minute random walk.
+        pred_len (int): Number of prediction steps.
+        precisions (Sequence[str]): Precisions to compare against fp32.
+        sample_count (int): Sample paths per series.
+        seed (int): Torch seed used for every run.
+
+    Returns:
+        dict: precision -> {"close_mean", "close_std", "mean_shift", "std_ratio", "ks_stat",
+                            "latency_s", "speedup", "weight_bytes", "memory_ratio"},
+              where shifts, ratios and the Kolmogorov-Smirnov statistic are relative to the "fp32" entry.
+    """
+    if x is None:
+        rng = np.random.default_rng(seed)
+        seq_len = 256
+        walk = np.cumsum(rng.standard_normal((2, seq_len, 6)), axis=1)
+        x = (walk - walk.mean(axis=1, keepdims=True)) / (
+            walk.std(axis=1, keepdims=True) + 1e-5
+        )
+        stamps = timestamp_features(
+            pd.date_range("2024-01-01", periods=seq_len + pred_len, freq="5min")
+        )
+        x_stamp = np.stack([stamps[:seq_len]] * len(x))
+        y_stamp = np.stack([stamps[seq_len:]] * len(x))
+
+    close_idx = 3
+    closes = {}
+    report = {}
+    for precision in ("fp32",) + tuple(p for p in precisions if p != "fp32"):
+        predictor = KronosPredictor(
+            copy.deepcopy(model),
+            copy.deepcopy(tokenizer),
+            device=device,
+            max_context=max_context,
+            precision=precision,
+        )
+        torch.manual_seed(seed)
+        start = time.perf_counter()
+        preds = predictor.generate(
+            x,
+            x_stamp,
+            y_stamp,
+            pred_len,
+            1.0,
+            0,
+            0.9,
+            sample_count,
+            False,
+            average=False,
+            decode_len=1,
+        )
+        latency = time.perf_counter() - start
+        closes[precision] = np.sort(preds[:, :, -1, close_idx].ravel())
+        report[precision] = {
+            "close_mean": float(np.mean(closes[precision])),
+            "close_std": float(np.std(closes[precision])),
+            "latency_s": latency,
+            "weight_bytes": module_nbytes(predictor.model)
+            + module_nbytes(predictor.tokenizer),
+        }
+
+    ref = report["fp32"]
+    for precision, entry in report.items():
+        # two-sample Kolmogorov-Smirnov statistic between the close distributions
+        grid = np.concatenate([closes["fp32"], closes[precision]])
+        ref_cdf = np.searchsorted(closes["fp32"], grid, side="right")
+        cdf = np.searchsorted(closes[precision], grid, side="right")
+        entry["ks_stat"] = float(np.max(np.abs(ref_cdf - cdf)) / len(closes[precision]))
+        entry["mean_shift"] = entry["close_mean"] - ref["close_mean"]
+        entry["std_ratio"] = entry["close_std"] / (ref["close_std"] + 1e-12)
+        entry["speedup"] = ref["latency_s"] / entry["latency_s"]
+        entry["memory_ratio"] = entry["weight_bytes"] / ref["weight_bytes"]
+    return report
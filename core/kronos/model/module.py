@@ -1,3 +1,4 @@
+import functools
 import math
 
 from einops import rearrange, reduce
@@ -270,7 +271,9 @@ class BSQuantizer(nn.Module):
         )
 
     def bits_to_indices(self, bits):
-        bits = (bits >= 0).to(torch.long)
+        if bits.dtype != torch.bool:
+            bits = bits >= 0
+        bits = bits.to(torch.long)
         indices = 2 ** torch.arange(
             0,
             bits.shape[-1],
@@ -280,6 +283,20 @@ class BSQuantizer(nn.Module):
         )
         return (bits * indices).sum(-1)
 
+    def encode(self, z, half=False):
+        """Inference-only quantization: token indices without the losses and metrics of `forward`.
+
+        Equivalent to the indices returned by `forward`: normalizing does not change the sign of
+        `z`, and the quantized code of a coordinate is +1 exactly when it is positive.
+        """
+        bits = z > 0
+        if half:
+            return [
+                self.bits_to_indices(bits[:, :, : self.s1_bits]),
+                self.bits_to_indices(bits[:, :, self.s1_bits :]),
+            ]
+        return self.bits_to_indices(bits)
+
     def forward(self, z, half=False):
         z = F.normalize(z, dim=-1)
         quantized, bsq_loss, metrics = self.bsq(z)
@@ -319,32 +336,61 @@ class FeedForward(nn.Module):
         return self.ffn_dropout(self.w2(F.silu(self.w1(x)) * self.w3(x)))
 
 
+# cos/sin tables shared by every RotaryPositionalEmbedding with the same head_dim,
+# keyed by (dim, device); sized for the default max_context and grown on demand.
+# They are always computed in fp32 and cast to the activation dtype when sliced.
+ROPE_TABLE_LEN = 2048
+_rope_tables = {}
+
+
+def rope_table(inv_freq, seq_len):
+    """Returns the shared fp32 (cos, sin) tables of shape [1, 1, len, dim], len >= seq_len."""
+    key = (inv_freq.numel() * 2, inv_freq.device)
+    table = _rope_tables.get(key)
+    if table is None or table[0].size(-2) < seq_len:
+        length = ROPE_TABLE_LEN
+        while length < seq_len:
+            length *= 2
+        inv_freq = inv_freq.float()
+        t = torch.arange(length, device=inv_freq.device).type_as(inv_freq)
+        freqs = torch.einsum("i,j->ij", t, inv_freq)
+        emb = torch.cat((freqs, freqs), dim=-1)
+        table = (emb.cos()[None, None, :, :], emb.sin()[None, None, :, :])
+        _rope_tables[key] = table
+    return table
+
+
 class RotaryPositionalEmbedding(nn.Module):
     def __init__(self, dim):
         super().__init__()
         inv_freq = 1.0 / (10000 ** (torch.arange(0, dim, 2).float() / dim))
         self.register_buffer("inv_freq", inv_freq)
-        self.seq_len_cached = None
-        self.cos_cached = None
-        self.sin_cached = None
-
-    def _update_cos_sin_cache(self, x, seq_len):
-        if seq_len != self.seq_len_cached:
-            self.seq_len_cached = seq_len
-            t = torch.arange(seq_len, device=x.device).type_as(self.inv_freq)
-            freqs = torch.einsum("i,j->ij", t, self.inv_freq)
-            emb = torch.cat((freqs, freqs), dim=-1).to(x.device)
-            self.cos_cached = emb.cos()[None, None, :, :]
-            self.sin_cached = emb.sin()[None, None, :, :]
-        return self.cos_cached, self.sin_cached
-
-    def forward(self, q, k):
-        cos, sin = self._update_cos_sin_cache(q, q.shape[-2])
+
+    def _cos_sin(self, offset, seq_len):
+        cos, sin = rope_table(self.inv_freq, offset + seq_len)
+        return (
+            cos[:, :, offset : offset + seq_len],
+            sin[:, :, offset : offset + seq_len],
+        )
+
+    def forward(self, q, k, offset=0):
+        """Rotates q and k by the angles of positions offset .. offset + q_len - 1."""
+        cos, sin = self._cos_sin(offset, q.shape[-2])
+        cos, sin = cos.to(q.dtype), sin.to(q.dtype)
         return (
             (q * cos) + (self._rotate_half(q) * sin),
             (k * cos) + (self._rotate_half(k) * sin),
         )
 
+    def shift(self, x, shift):
+        """Rotates already rotated keys `x` by `shift` further positions (back for negative shifts).
+
+        Rotations compose, so keys cached at positions p end up exactly as if rotated at p + shift.
+        """
+        angle = torch.cat([shift * self.inv_freq, shift * self.inv_freq], dim=-1)
+        cos, sin = angle.cos().to(x.dtype), angle.sin().to(x.dtype)
+        return (x * cos) + (self._rotate_half(x) * sin)
+
     def _rotate_half(self, x):
         x1, x2 = x.chunk(2, dim=-1)
         return torch.cat((-x2, x1), dim=-1)
@@ -366,7 +412,10 @@ def scaled_dot_product_attention(
 
     if is_causal:
         assert attn_mask is None
-        temp_mask = torch.ones(L, S, dtype=torch.bool).tril(diagonal=0).to(query.device)
+        # queries are the last L positions of the S keys (L < S with a kv cache)
+        temp_mask = (
+            torch.ones(L, S, dtype=torch.bool).tril(diagonal=S - L).to(query.device)
+        )
         attn_bias.masked_fill_(temp_mask.logical_not(), float("-inf"))
         attn_bias.to(query.dtype)
 
@@ -386,6 +435,211 @@ def scaled_dot_product_attention(
     return attn_weight @ value
 
 
+# "sdpa": PyTorch's fused scaled_dot_product_attention kernels
+# "math": the reference implementation above, which materializes the attention matrix
+ATTENTION_BACKENDS = ("sdpa", "math")
+_attention_backend = "sdpa"
+
+
+def set_attention_backend(backend):
+    """Selects the attention implementation used by all attention modules."""
+    global _attention_backend
+    if backend not in ATTENTION_BACKENDS:
+        raise ValueError(
+            f"Unknown attention backend {backend!r}, expected one of {ATTENTION_BACKENDS}"
+        )
+    _attention_backend = backend
+
+
+def get_attention_backend():
+    return _attention_backend
+
+
+@functools.lru_cache(maxsize=64)
+def causal_mask(q_len, kv_len, device):
+    """Boolean [q_len, kv_len] mask, True where the last q_len of kv_len positions may attend."""
+    return torch.ones(q_len, kv_len, dtype=torch.bool, device=device).tril(
+        diagonal=kv_len - q_len
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def diagonal_mask(q_len, kv_len, device):
+    """Boolean [q_len, kv_len] mask, True where each of the last q_len positions meets its own key."""
+    rows = torch.arange(q_len, device=device)[:, None]
+    cols = torch.arange(kv_len, device=device)[None, :]
+    return cols == rows + (kv_len - q_len)
+
+
+def attention(
+    query,
+    key,
+    value,
+    key_padding_mask=None,
+    dropout_p=0.0,
+    is_causal=False,
+    training=True,
+):
+    """
+    Multi-head attention core with the selected backend.
+
+    query: [batch, n_heads, q_len, head_dim]
+    key, value: [batch, n_heads, kv_len, head_dim]
+    key_padding_mask: [batch, kv_len], True (or -inf for float masks) marks keys to ignore
+    is_causal: the queries are the last q_len of the kv_len positions and only see keys up to their own
+    """
+    q_len, kv_len = query.size(-2), key.size(-2)
+    # a single query sits at the last position and may attend to every key
+    is_causal = is_causal and q_len > 1
+
+    attn_mask = None
+    if key_padding_mask is not None:
+        attn_mask = key_padding_mask[:, None, None, :]  # [batch, 1, 1, kv_len]
+        if is_causal:
+            # A (left-)padded query would have every causal key masked and turn into NaN,
+            # which then leaks through the zero attention weights of the next layer.
+            # Every query may always attend to its own key; for valid queries that key is
+            # valid anyway, so their outputs are unchanged.
+            own_key = diagonal_mask(q_len, kv_len, query.device)
+            if attn_mask.dtype == torch.bool:
+                attn_mask = attn_mask & own_key.logical_not()
+            else:
+                attn_mask = attn_mask.masked_fill(own_key, 0.0)
+
+    if _attention_backend == "math":
+        if attn_mask is not None and is_causal:
+            not_causal = causal_mask(q_len, kv_len, query.device).logical_not()
+            if attn_mask.dtype == torch.bool:
+                attn_mask = attn_mask | not_causal
+            else:
+                attn_mask = attn_mask.masked_fill(not_causal, float("-inf"))
+            is_causal = False
+        return scaled_dot_product_attention(
+            query,
+            key,
+            value,
+            attn_mask=attn_mask,
+            dropout_p=dropout_p,
+            is_causal=is_causal,
+            training=training,
+        )
+
+    dropout_p = dropout_p if training else 0.0
+    if attn_mask is None:
+        if is_causal and q_len != kv_len:
+            attn_mask = causal_mask(q_len, kv_len, query.device)
+            is_causal = False
+    else:
+        # F.scaled_dot_product_attention keeps the positions where a bool mask is True
+        if attn_mask.dtype == torch.bool:
+            attn_mask = attn_mask.logical_not()
+            if is_causal:
+                attn_mask = attn_mask & causal_mask(q_len, kv_len, query.device)
+        elif is_causal:
+            attn_mask = attn_mask.masked_fill(
+                causal_mask(q_len, kv_len, query.device).logical_not(), float("-inf")
+            )
+        is_causal = False
+    return F.scaled_dot_product_attention(
+        query,
+        key,
+        value,
+        attn_mask=attn_mask,
+        dropout_p=dropout_p,
+        is_causal=is_causal,
+    )
+
+
+class KVCache:
+    """
+    Key/value cache of one attention layer, [batch, n_heads, len, head_dim].
+
+    Entries are written in place into preallocated buffers that only grow (geometrically) when
+    full, so a decoding step does not copy the history; `keys`/`values` are views of the filled part.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.k_buf = None
+        self.v_buf = None
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def capacity(self):
+        return 0 if self.k_buf is None else self.k_buf.size(2)
+
+    @property
+    def keys(self):
+        return None if self.k_buf is None else self.k_buf[:, :, : self.length]
+
+    @property
+    def values(self):
+        return None if self.v_buf is None else self.v_buf[:, :, : self.length]
+
+    @staticmethod
+    def _allocate(like, batch_size, capacity):
+        return like.new_empty(batch_size, like.size(1), capacity, like.size(3))
+
+    def reserve(self, capacity):
+        """Makes room for `capacity` positions without further reallocation."""
+        if self.k_buf is None or capacity <= self.capacity:
+            return
+        k_buf = self._allocate(self.k_buf, self.k_buf.size(0), capacity)
+        v_buf = self._allocate(self.v_buf, self.v_buf.size(0), capacity)
+        k_buf[:, :, : self.length] = self.keys
+        v_buf[:, :, : self.length] = self.values
+        self.k_buf, self.v_buf = k_buf, v_buf
+
+    def load(self, keys, values):
+        """Replaces the cache with the given [batch, n_heads, len, head_dim] entries (not copied)."""
+        self.k_buf, self.v_buf = keys, values
+        self.length = keys.size(2)
+
+    def append(self, k, v):
+        """Appends [batch, n_heads, new_len, head_dim] entries and returns the cached keys and values."""
+        end = self.length + k.size(2)
+        if self.k_buf is None:
+            self.k_buf = self._allocate(k, k.size(0), end)
+            self.v_buf = self._allocate(v, v.size(0), end)
+        elif end > self.capacity:
+            self.reserve(max(end, 2 * self.capacity))
+        self.k_buf[:, :, self.length : end] = k
+        self.v_buf[:, :, self.length : end] = v
+        self.length = end
+        return self.keys, self.values
+
+    def repeat(self, repeats, capacity=None):
+        """Fans each row out to `repeats` consecutive rows, optionally reserving `capacity` positions.
+
+        `repeats` is an int, or a tensor with the number of rows of every cached row.
+        """
+        if self.k_buf is None:
+            return
+        capacity = max(self.length, capacity or 0)
+        if torch.is_tensor(repeats):
+            rows = torch.arange(len(repeats), device=repeats.device)
+            rows = rows.repeat_interleave(repeats).to(self.k_buf.device)
+            k_buf = self._allocate(self.k_buf, len(rows), capacity)
+            v_buf = self._allocate(self.v_buf, len(rows), capacity)
+            k_buf[:, :, : self.length] = self.keys[rows]
+            v_buf[:, :, : self.length] = self.values[rows]
+            self.k_buf, self.v_buf = k_buf, v_buf
+            return
+        batch_size = self.k_buf.size(0)
+        k_buf = self._allocate(self.k_buf, batch_size * repeats, capacity)
+        v_buf = self._allocate(self.v_buf, batch_size * repeats, capacity)
+        k_view = k_buf.view(batch_size, repeats, *k_buf.shape[1:])
+        v_view = v_buf.view(batch_size, repeats, *v_buf.shape[1:])
+        k_view[:, :, :, : self.length] = self.keys.unsqueeze(1)
+        v_view[:, :, :, : self.length] = self.values.unsqueeze(1)
+        self.k_buf, self.v_buf = k_buf, v_buf
+
+
 class MultiHeadAttentionWithRoPE(nn.Module):
     def __init__(self, d_model, n_heads, attn_dropout_p=0.0, resid_dropout_p=0.0):
         super().__init__()
@@ -401,7 +655,26 @@ class MultiHeadAttentionWithRoPE(nn.Module):
         self.attn_dropout_p = attn_dropout_p
         self.resid_dropout = nn.Dropout(resid_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+        # per-layer key/value cache for incremental decoding
+        self.kv_cache = KVCache()
+
+    def reset_cache(self):
+        self.kv_cache.reset()
+
+    def repeat_cache(self, repeats, capacity=None):
+        """Fans each cached row out to `repeats` consecutive rows (shared prompt -> sample paths)."""
+        self.kv_cache.repeat(repeats, capacity)
+
+    @property
+    def cache_len(self):
+        return len(self.kv_cache)
+
+    def forward(self, x, key_padding_mask=None, use_cache=False):
+        """
+        x: [batch, seq_len, d_model]
+        key_padding_mask: [batch, kv_len], covers the cached keys as well when use_cache=True
+        use_cache: append k/v of `x` to the cache and attend over all cached positions
+        """
         batch_size, seq_len, _ = x.shape
 
         q = (
@@ -420,23 +693,17 @@ class MultiHeadAttentionWithRoPE(nn.Module):
             .transpose(1, 2)
         )
 
-        q, k = self.rotary(q, k)
+        offset = self.cache_len if use_cache else 0
+        q, k = self.rotary(q, k, offset)
 
-        if key_padding_mask is not None:
-            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(
-                2
-            )  # [batch, 1, 1, seq_len]
-            attn_mask = attn_mask.expand(
-                -1, self.n_heads, seq_len, -1
-            )  # [batch, n_heads, q_len, k_len]
-        else:
-            attn_mask = None
+        if use_cache:
+            k, v = self.kv_cache.append(k, v)
 
-        attn_output = scaled_dot_product_attention(
+        attn_output = attention(
             q,
             k,
             v,
-            attn_mask=attn_mask,
+            key_padding_mask=key_padding_mask,
             dropout_p=self.attn_dropout_p,
             is_causal=True,
             training=self.training,
@@ -465,7 +732,45 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
         self.attn_dropout_p = attn_dropout_p
         self.resid_dropout = nn.Dropout(resid_dropout)
 
-    def forward(self, query, key, value, key_padding_mask=None):
+        # key/value cache of the attended context for incremental decoding
+        self.kv_cache = KVCache()
+
+    def reset_cache(self):
+        self.kv_cache.reset()
+
+    def repeat_cache(self, repeats, capacity=None):
+        """Fans each cached row out to `repeats` consecutive rows (shared prompt -> sample paths)."""
+        self.kv_cache.repeat(repeats, capacity)
+
+    @property
+    def cache_len(self):
+        return len(self.kv_cache)
+
+    def extend_cache(self, key, value):
+        """Appends context positions to the cache without running a query.
+
+        Cached decoding always uses a single query position, whose rotary angle is zero,
+        so the cached keys are stored unrotated, exactly as `forward` would leave them.
+        """
+        batch_size, seq_len, _ = key.shape
+        k = (
+            self.k_proj(key)
+            .view(batch_size, seq_len, self.n_heads, self.head_dim)
+            .transpose(1, 2)
+        )
+        v = (
+            self.v_proj(value)
+            .view(batch_size, seq_len, self.n_heads, self.head_dim)
+            .transpose(1, 2)
+        )
+        self.kv_cache.append(k, v)
+
+    def forward(self, query, key, value, key_padding_mask=None, use_cache=False):
+        """
+        query: [batch, q_len, d_model]
+        key, value: [batch, seq_len, d_model], only the positions new since the last call when use_cache=True
+        key_padding_mask: [batch, kv_len], covers the cached keys as well when use_cache=True
+        """
         batch_size, q_len, _ = query.shape
         _, seq_len, _ = key.shape
 
@@ -487,19 +792,16 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
 
         q, k = self.rotary(q, k)
 
-        if key_padding_mask is not None:
-            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)
-            attn_mask = attn_mask.expand(-1, self.n_heads, q_len, -1)
-        else:
-            attn_mask = None
+        if use_cache:
+            k, v = self.kv_cache.append(k, v)
 
         is_causal_flag = self.training
 
-        attn_output = scaled_dot_product_attention(
+        attn_output = attention(
             q,
             k,
             v,
-            attn_mask=attn_mask,
+            key_padding_mask=key_padding_mask,
             dropout_p=self.attn_dropout_p,
             is_causal=is_causal_flag,
             training=self.training,
@@ -530,6 +832,27 @@ class HierarchicalEmbedding(nn.Module):
         nn.init.normal_(self.emb_s1.weight, mean=0, std=d_model**-0.5)
         nn.init.normal_(self.emb_s2.weight, mean=0, std=d_model**-0.5)
 
+        # inference-only [vocab, d_model] tables, see fuse_tables()
+        self.register_buffer("fused_s1", None, persistent=False)
+        self.register_buffer("fused_s2", None, persistent=False)
+
+    @torch.no_grad()
+    def fuse_tables(self):
+        """Folds the sqrt(d_model) scale and the linear `fusion_proj` into per-vocabulary tables.
+
+        fusion_proj([s1 * c, s2 * c]) == (c * W_s1 s1 + b) + c * W_s2 s2, so in eval mode the
+        embedding becomes two gathers and an add. The tables are snapshots: call again after
+        the weights change.
+        """
+        scale = math.sqrt(self.d_model)
+        w_s1, w_s2 = self.fusion_proj.weight.split(self.d_model, dim=1)
+        self.fused_s1 = (self.emb_s1.weight * scale) @ w_s1.T + self.fusion_proj.bias
+        self.fused_s2 = (self.emb_s2.weight * scale) @ w_s2.T
+
+    def unfuse_tables(self):
+        self.fused_s1 = None
+        self.fused_s2 = None
+
     def forward(self, token_ids):
         """Inputs:
         token_ids: [batch_size, seq_len] token ID
@@ -539,6 +862,10 @@ class HierarchicalEmbedding(nn.Module):
             s1_ids, s2_ids = token_ids
         else:
             s1_ids, s2_ids = self.split_token(token_ids, self.s2_bits)
+        if self.fused_s1 is not None and not self.training:
+            return F.embedding(s1_ids, self.fused_s1) + F.embedding(
+                s2_ids, self.fused_s2
+            )
         s1_emb = self.emb_s1(s1_ids) * math.sqrt(self.d_model)
         s2_emb = self.emb_s2(s2_ids) * math.sqrt(self.d_model)
         return self.fusion_proj(torch.cat([s1_emb, s2_emb], dim=-1))
@@ -552,16 +879,23 @@ class DependencyAwareLayer(nn.Module):
         )
         self.norm = RMSNorm(d_model)
 
-    def forward(self, hidden_states, sibling_embed, key_padding_mask=None):
+    def forward(
+        self, hidden_states, sibling_embed, key_padding_mask=None, use_cache=False
+    ):
         """hidden_states: [batch, seq_len, d_model]
         sibling_embed: Embedding from another subtoken
+        use_cache: hidden_states only holds the new positions, which are appended to the
+            cross-attention cache; the output covers the last q_len positions only
         """
         attn_out = self.cross_attn(
             query=sibling_embed,
             key=hidden_states,
             value=hidden_states,
             key_padding_mask=key_padding_mask,
+            use_cache=use_cache,
         )
+        if use_cache:
+            hidden_states = hidden_states[:, -sibling_embed.size(1) :]
         return self.norm(hidden_states + attn_out)
 
 
@@ -583,10 +917,12 @@ class TransformerBlock(nn.Module):
         self.norm2 = RMSNorm(d_model)
         self.ffn = FeedForward(d_model, ff_dim, ffn_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    def forward(self, x, key_padding_mask=None, use_cache=False):
         residual = x
         x = self.norm1(x)
-        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask)
+        attn_out = self.self_attn(
+            x, key_padding_mask=key_padding_mask, use_cache=use_cache
+        )
         x = residual + attn_out
 
         residual = x
@@ -680,4 +1016,4 @@ class TemporalEmbedding(nn.Module):
         day_x = self.day_embed(x[:, :, 3])
         month_x = self.month_embed(x[:, :, 4])
 
-        return hour_x + weekday_x + day_x + month_x + minute_x
\ No newline at end of file
+        return hour_x + weekday_x + day_x + month_x + minute_x
@@ -1,7 +1,7 @@
 from logging import logProcesses
 from typing import Tuple
 from core.okx.retry import retry
-from core.config import Config
+from core.config import get_config
 
 import okx.Account
 import okx.Trade
@@ -11,7 +11,7 @@ import okx.MarketData
 
 class APIService:
     def __init__(self):
-        config = Config()
+        config = get_config()
         self.config = config
         apikey = config.apikey
         secretkey = config.secretkey
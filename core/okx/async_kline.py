@@ -0,0 +1,201 @@
+import asyncio
+import time
+
+import httpx
+
+from core.config import get_config
+from core.okx.kline import parse_candles
+
+CANDLES_PATH = "/api/v5/market/history-candles"
+RATE_LIMIT_CODE = "50011"  # OKX: too many requests
+
+
+def _json_body(resp):
+    """The JSON object of a response, or None for a body that is empty, not JSON or not decodable."""
+    if "json" not in resp.headers.get("content-type", ""):
+        return None
+    try:
+        data = resp.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class RateLimiter:
+    """
+    Limiter shared by all requests of a client: at most `rate` requests in any `per` seconds.
+
+    OKX limits market data per IP and endpoint (history-candles: 20 requests per 2 seconds), so
+    one limiter covers every coin. A slot is given back `per` seconds after its response arrived,
+    not after the request was sent, so network jitter cannot squeeze a 21st request into the
+    server's window.
+    """
+
+    def __init__(self, rate=20, per=2.0):
+        self.rate = rate
+        self.per = per
+        self._slots = asyncio.Semaphore(rate)
+        self._blocked_until = 0.0
+
+    async def acquire(self):
+        await self._slots.acquire()
+        while (wait := self._blocked_until - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    def release(self):
+        asyncio.get_running_loop().call_later(self.per, self._slots.release)
+
+    def block(self, seconds):
+        """Holds back every request for `seconds`, after the server reported a rate limit."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class AsyncCandleClient:
+    """
+    Asynchronous OKX candle client: one pooled keep-alive connection set, shared by all coins.
+
+    Each coin pages backwards through `after` cursors as `get_okx_data` does; different coins are
+    fetched concurrently, all under one `RateLimiter`. Rate-limit answers (HTTP 429 or code 50011)
+    and server errors (HTTP 5xx, or a body that is not JSON such as a gateway's error page) hold
+    back every request for one window and are retried up to `rate_limit_retries` times, so a
+    lasting ban or outage fails the fetch instead of hanging it; transport errors are retried
+    `retries` times.
+
+    Use as `async with AsyncCandleClient() as client: frames = await client.fetch_many(...)`.
+
+    Args:
+        base_url (str, optional): Scheme and host of the API. Defaults to `Config.okx_base_url`.
+        bar (str): Candle interval. Defaults to "5m".
+        limit (int): Candles per request.
+        rate (int), per (float): Rate limit, `rate` requests per `per` seconds.
+        max_connections (int): Size of the connection pool.
+        timeout (float): Request timeout in seconds.
+        retries (int): Attempts per page on transport errors.
+        rate_limit_retries (int): Retries per page after rate-limit answers and server errors,
+                                  one window apart.
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        bar="5m",
+        limit=100,
+        rate=None,
+        per=2.0,
+        max_connections=None,
+        timeout=10.0,
+        retries=5,
+        rate_limit_retries=30,
+    ):
+        config = get_config()
+        self.base_url = base_url or config.okx_base_url
+        self.bar = bar
+        self.limit = limit
+        self.retries = retries
+        self.rate_limit_retries = rate_limit_retries
+        self.limiter = RateLimiter(rate or config.okx_rate_limit, per)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections or config.okx_max_connections,
+                max_keepalive_connections=max_connections or config.okx_max_connections,
+            ),
+        )
+        self.requests = 0
+
+    async def fetch_page(self, inst_id, after="", before=""):
+        """One page of raw candles (newest first), as `fetch_candles` returns it."""
+        params = {"instId": inst_id, "bar": self.bar, "limit": self.limit}
+        if after:
+            params["after"] = after
+        if before:
+            params["before"] = before
+        attempt = 0
+        limited = 0
+        while True:
+            await self.limiter.acquire()
+            self.requests += 1
+            try:
+                resp = await self._client.get(CANDLES_PATH, params=params)
+            except httpx.TransportError:
+                attempt += 1
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(0.5 * 2**attempt)
+                continue
+            finally:
+                self.limiter.release()
+            data = _json_body(resp)
+            if (
+                resp.status_code == 429
+                or resp.status_code >= 500
+                or data is None
+                or data.get("code") == RATE_LIMIT_CODE
+            ):
+                # the window is full after all (e.g. another process), or the server is down:
+                # wait it out and retry
+                limited += 1
+                if limited > self.rate_limit_retries:
+                    raise RuntimeError(
+                        f"Still rate limited or unavailable after {self.rate_limit_retries} "
+                        f"retries: HTTP {resp.status_code} {data or resp.text[:200]!r}"
+                    )
+                self.limiter.block(self.limiter.per)
+                continue
+            if data.get("code") != "0":
+                raise RuntimeError(f"API Error: {data}")
+            return data["data"]
+
+    async def fetch_raw(self, inst_id, number, since=None, until=None):
+        """
+        The latest `number` raw candles of `inst_id`, newest first. With `since` (ms), only candles
+        newer than it are requested, so catching up on a few bars takes a single request; `number`
+        may then be None for all of them. With `until` (ms), paging starts at the candles older
+        than it instead of the current one.
+        """
+        candles = []
+        after = "" if until is None else str(until)
+        before = "" if since is None else str(since)
+        while number is None or len(candles) < number:
+            page = await self.fetch_page(inst_id, after, before)
+            if not page:
+                break
+            candles.extend(page)
+            if since is not None and len(page) < self.limit:
+                break  # reached `since`
+            after = page[-1][0]
+        return candles if number is None else candles[:number]
+
+    async def fetch(self, inst_id, number):
+        """The latest `number` candles of `inst_id` as a `get_okx_data` DataFrame."""
+        return parse_candles(await self.fetch_raw(inst_id, number))
+
+    async def fetch_many(self, inst_ids, number):
+        """`fetch` for every instrument concurrently; frames in the order of `inst_ids`."""
+        tasks = [asyncio.ensure_future(self.fetch(i, number)) for i in inst_ids]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()  # don't leave the other coins running on a closing client
+            raise
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def fetch_okx_data(inst_ids, number, **kwargs):
+    """Synchronous entry point: the latest `number` candles of every instrument, fetched concurrently."""
+
+    async def run():
+        async with AsyncCandleClient(**kwargs) as client:
+            return await client.fetch_many(inst_ids, number)
+
+    return asyncio.run(run())
@@ -0,0 +1,268 @@
+"""
+Bulk download of historical candles into a `CandleStore`, for backtests and tuning.
+
+The date range is split into independent time slices that are fetched concurrently over one
+pooled client, all under the client's rate limiter (the global request budget). Every finished
+slice is saved under the store's `download/` directory and listed in a checkpoint, so an
+interrupted download resumes with the missing slices only. Once all slices are in, they are
+merged into the store: sorted, deduplicated (downloaded bars win over stored ones) and checked
+for gaps.
+
+    python -m core.okx.bulk_download BTC-USDT 2025-01-01 2025-04-01 [--mock]
+
+`--mock` runs against a local `MockOKXServer` to measure the throughput.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.config import get_config
+from core.okx.async_kline import AsyncCandleClient
+from core.okx.candle_store import BAR_MS, CandleStore
+from core.okx.kline import parse_candle_arrays
+
+
+def merge_candles(*parts):
+    """
+    Concatenates (timestamps, values, confirmed) parts into one ascending series without duplicates;
+    for a timestamp present in several parts the later part wins.
+
+    Returns:
+        Tuple: (timestamps, values, confirmed, duplicates dropped)
+    """
+    timestamps = np.concatenate([p[0] for p in parts])
+    values = np.concatenate([p[1] for p in parts])
+    confirmed = np.concatenate([p[2] for p in parts])
+    order = np.argsort(timestamps, kind="stable")
+    timestamps = timestamps[order]
+    # the last row of every run of equal timestamps
+    keep = np.append(timestamps[1:] != timestamps[:-1], True)
+    return (
+        timestamps[keep],
+        values[order][keep],
+        confirmed[order][keep],
+        int(keep.size - keep.sum()),
+    )
+
+
+def find_gaps(timestamps, bar_ms, start_ms=None, end_ms=None):
+    """
+    Missing stretches of an ascending series: list of (first missing, last missing, bars missing),
+    as bar open times in ms.
+
+    With `start_ms` and `end_ms` the series is checked against every bar opening in [start_ms, end_ms),
+    so bars missing at either end (or altogether) are reported as well; without them only the holes
+    between its first and last bar.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if start_ms is not None:
+        first = start_ms + (-start_ms % bar_ms)
+        last = (end_ms - 1) - (end_ms - 1) % bar_ms  # last bar opening before end_ms
+        timestamps = timestamps[(timestamps >= first) & (timestamps <= last)]
+        # one bar outside the range on either side, so the edges are holes like any other
+        timestamps = np.concatenate([[first - bar_ms], timestamps, [last + bar_ms]])
+    steps = np.diff(timestamps)
+    at = np.flatnonzero(steps > bar_ms)
+    return [
+        (
+            int(timestamps[i] + bar_ms),
+            int(timestamps[i + 1] - bar_ms),
+            int(steps[i] // bar_ms - 1),
+        )
+        for i in at
+    ]
+
+
+class BulkDownloader:
+    """
+    Args:
+        root (str, optional): Directory of the candle stores. Defaults to `Config.backtest_store_dir`,
+                              apart from the stores `main_infer` keeps in sync: merging a past range
+                              there would leave a hole before the live bars.
+        bar (str): Candle interval. Defaults to "5m".
+        slice_bars (int): Bars per time slice, each one a chain of requests. Defaults to 2000.
+        concurrency (int): Slices in flight at once. Defaults to 8.
+        **client_kwargs: Passed on to `AsyncCandleClient` (base_url, rate, per, ...).
+    """
+
+    def __init__(
+        self, root=None, bar="5m", slice_bars=2000, concurrency=8, **client_kwargs
+    ):
+        self.root = root or get_config().backtest_store_dir
+        self.bar = bar
+        self.bar_ms = BAR_MS[bar]
+        self.slice_bars = slice_bars
+        self.concurrency = concurrency
+        self.client_kwargs = client_kwargs
+        self.last_report = None
+
+    def slices(self, start_ms, end_ms):
+        """[start, end) ms ranges covering the bars that open in [start_ms, end_ms)."""
+        start_ms += -start_ms % self.bar_ms  # first bar open at or after start
+        step = self.slice_bars * self.bar_ms
+        return [(a, min(a + step, end_ms)) for a in range(start_ms, end_ms, step)]
+
+    def download(self, inst_id, start, end):
+        """
+        Downloads the bars opening in [start, end) (anything `pd.Timestamp` takes, UTC) into the store
+        of `inst_id`, resuming a previous run of the same range.
+
+        Returns:
+            dict: Throughput report, also kept in `last_report`.
+        """
+        start_ms = pd.Timestamp(start, tz="UTC").value // 1_000_000
+        end_ms = pd.Timestamp(end, tz="UTC").value // 1_000_000
+        if start_ms >= end_ms:
+            raise ValueError(f"Empty download range: {start} to {end}.")
+        return asyncio.run(self._download(inst_id, start_ms, end_ms))
+
+    async def _download(self, inst_id, start_ms, end_ms):
+        store = CandleStore(self.root, inst_id, self.bar)
+        work_dir = os.path.join(store.path, "download")
+        os.makedirs(work_dir, exist_ok=True)
+        checkpoint = _Checkpoint(work_dir, start_ms, end_ms, self.slice_bars)
+        slices = self.slices(start_ms, end_ms)
+        todo = [s for s in slices if not checkpoint.has(s)]
+
+        begin = time.perf_counter()
+        fetched = 0
+        async with AsyncCandleClient(bar=self.bar, **self.client_kwargs) as client:
+            gate = asyncio.Semaphore(self.concurrency)
+
+            async def run(piece):
+                nonlocal fetched
+                async with gate:
+                    raw = await client.fetch_raw(
+                        inst_id, None, since=piece[0] - 1, until=piece[1]
+                    )
+                timestamps, values, confirmed = parse_candle_arrays(raw)
+                checkpoint.save(piece, timestamps.astype(np.int64), values, confirmed)
+                fetched += len(timestamps)
+
+            tasks = [asyncio.ensure_future(run(piece)) for piece in todo]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()  # finished slices stay checkpointed for the next run
+                raise
+            requests = client.requests
+        seconds = time.perf_counter() - begin
+
+        parts = [checkpoint.load(piece) for piece in slices]
+        parts = [part for part in parts if len(part[0])]
+        if parts:
+            if len(store):
+                parts.insert(0, (store.timestamps, store.values, store.confirmed))
+            timestamps, values, confirmed, duplicates = merge_candles(*parts)
+            store.rewrite(timestamps, values, confirmed)
+        else:
+            # nothing new (e.g. a range that has no bar opening in it yet)
+            timestamps, duplicates = np.asarray(store.timestamps), 0
+        checkpoint.finish(slices)
+
+        # bars still to come are not missing (nor is the one in progress)
+        now_ms = int(time.time() * 1000)
+        gaps = find_gaps(
+            timestamps,
+            self.bar_ms,
+            start_ms,
+            min(end_ms, now_ms - now_ms % self.bar_ms),
+        )
+        self.last_report = {
+            "inst_id": inst_id,
+            "slices": len(slices),
+            "resumed_slices": len(slices) - len(todo),
+            "bars": fetched,
+            "requests": requests,
+            "seconds": seconds,
+            "bars_per_s": fetched / seconds if seconds else 0.0,
+            "requests_per_s": requests / seconds if seconds else 0.0,
+            "duplicates": duplicates,
+            "gaps": gaps,
+            "missing_bars": sum(g[2] for g in gaps),
+            # holes anywhere in the store, e.g. between this range and one downloaded before
+            "store_gaps": find_gaps(timestamps, self.bar_ms),
+            "stored_bars": len(store),
+        }
+        return self.last_report
+
+
+class _Checkpoint:
+    """Finished slices of one download range: a .npz per slice plus a manifest listing them."""
+
+    def __init__(self, work_dir, start_ms, end_ms, slice_bars):
+        self.work_dir = work_dir
+        self.manifest = os.path.join(work_dir, "checkpoint.json")
+        self.range = [start_ms, end_ms, slice_bars]
+        self.done = set()
+        if os.path.exists(self.manifest):
+            with open(self.manifest) as f:
+                state = json.load(f)
+            if state["range"] == self.range:  # another range starts over
+                self.done = {tuple(s) for s in state["done"]}
+
+    def _path(self, piece):
+        return os.path.join(self.work_dir, f"{piece[0]}-{piece[1]}.npz")
+
+    def has(self, piece):
+        return piece in self.done and os.path.exists(self._path(piece))
+
+    def save(self, piece, timestamps, values, confirmed):
+        tmp = self._path(piece) + ".tmp.npz"
+        np.savez(tmp, timestamps=timestamps, values=values, confirmed=confirmed)
+        os.replace(tmp, self._path(piece))
+        self.done.add(piece)
+        tmp = self.manifest + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"range": self.range, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.manifest)
+
+    def load(self, piece):
+        with np.load(self._path(piece)) as data:
+            return data["timestamps"], data["values"], data["confirmed"]
+
+    def finish(self, slices):
+        for piece in slices:
+            os.remove(self._path(piece))
+        if os.path.exists(self.manifest):  # not written when there were no slices
+            os.remove(self.manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("inst_id")
+    parser.add_argument("start")
+    parser.add_argument("end")
+    parser.add_argument("--bar", default="5m")
+    parser.add_argument("--root", default=None)
+    parser.add_argument(
+        "--mock", action="store_true", help="download from a local mock"
+    )
+    args = parser.parse_args()
+
+    if not args.mock:
+        report = BulkDownloader(args.root, args.bar).download(
+            args.inst_id, args.start, args.end
+        )
+        print(report)
+        return
+
+    from core.okx.mock_server import MockOKXServer
+
+    end_ms = pd.Timestamp(args.end, tz="UTC").value // 1_000_000
+    start_ms = pd.Timestamp(args.start, tz="UTC").value // 1_000_000
+    history = (end_ms - start_ms) // BAR_MS[args.bar] + 10
+    with MockOKXServer(history=history, bar=args.bar, now_ms=end_ms, rate=20) as server:
+        downloader = BulkDownloader(args.root, args.bar, base_url=server.url)
+        print(downloader.download(args.inst_id, args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
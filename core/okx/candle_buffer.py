@@ -0,0 +1,97 @@
+import numpy as np
+
+COLUMNS = ["open", "high", "low", "close", "volume", "amount"]
+
+
+class CandleRingBuffer:
+    """
+    Fixed-size in-memory candles of one instrument: float32 [capacity, 6] values in `COLUMNS` order
+    plus int64 epoch-ms timestamps, updated in place as candles arrive.
+
+    Every row is written twice, at `p` and `p + capacity`, so the latest `n` rows are always one
+    contiguous slice and `window` returns views without copying or reordering. The views show the
+    buffer as it is: read them before the next `update`.
+
+    Args:
+        capacity (int): Rows kept, at least the model lookback.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((2 * capacity, len(COLUMNS)), dtype=np.float32)
+        self._last = -1  # position of the newest row in [0, capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        return int(self._timestamps[self._last]) if self._size else None
+
+    def update(self, timestamps, values):
+        """
+        Takes candles in ascending time order: a row with the newest stored timestamp replaces it
+        (the open candle moved), newer rows are appended, older ones are ignored.
+
+        Returns:
+            int: Number of rows written.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values)
+        last = self.last_timestamp
+        replaced = 0
+        if last is not None:
+            keep = timestamps >= last
+            timestamps, values = timestamps[keep], values[keep]
+            if timestamps.size and timestamps[0] == last:
+                self._write(np.array([self._last]), timestamps[:1], values[:1])
+                timestamps, values = timestamps[1:], values[1:]
+                replaced = 1
+        timestamps, values = timestamps[-self.capacity :], values[-self.capacity :]
+        n = len(timestamps)
+        if n:
+            positions = (self._last + 1 + np.arange(n)) % self.capacity
+            self._write(positions, timestamps, values)
+            self._last = int(positions[-1])
+            self._size = min(self.capacity, self._size + n)
+        return replaced + n
+
+    def _write(self, positions, timestamps, values):
+        for offset in (0, self.capacity):
+            self._timestamps[positions + offset] = timestamps
+            self._values[positions + offset] = values
+
+    def window(self, number=None):
+        """Views of the latest `number` (default: all) rows: (timestamps int64 ms, values float32 [n, 6])."""
+        number = self._size if number is None else min(number, self._size)
+        end = self._last + 1 + self.capacity
+        return (
+            self._timestamps[end - number : end],
+            self._values[end - number : end],
+        )
+
+
+class MarketDataCache:
+    """Per-instrument `CandleRingBuffer`s, created on first use."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def buffer(self, inst_id):
+        if inst_id not in self.buffers:
+            self.buffers[inst_id] = CandleRingBuffer(self.capacity)
+        return self.buffers[inst_id]
+
+    def update_from_store(self, store, written):
+        """Feeds the bars a `CandleStore.sync` just wrote (plus the one it may have replaced)."""
+        buffer = self.buffer(store.inst_id)
+        number = self.capacity if not len(buffer) else written + 1
+        return buffer.update(*store.window(number))
+
+    def windows(self, inst_ids, number):
+        """(values_list, timestamps_list) of the latest `number` rows, as `KronosPredictor.predict_arrays` takes them."""
+        views = [self.buffer(inst_id).window(number) for inst_id in inst_ids]
+        return [values for _, values in views], [timestamps for timestamps, _ in views]
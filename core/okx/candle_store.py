@@ -0,0 +1,176 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.okx.async_kline import AsyncCandleClient
+from core.okx.kline import parse_candle_arrays
+
+COLUMNS = ["open", "high", "low", "close", "volume", "amount"]
+BAR_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1H": 3_600_000}
+
+
+class CandleStore:
+    """
+    Persistent candles of one (instId, bar), as memory-mapped column files under `root/instId/bar`:
+
+        timestamps.i8   int64 bar open times in ms, ascending
+        values.f8       float64 [n, 6] open, high, low, close, volume, amount
+        confirmed.u1    uint8, 0 while the bar is still open
+
+    `sync` fetches only the bars newer than the last stored one (and refetches that one if it was
+    still open), which is a single request per cycle once the store is warm. A store that fell
+    further behind than the synced history starts over with it. `window` returns views
+    into the mapped files, nothing is copied or parsed; the store survives restarts.
+
+    Args:
+        root (str): Directory of all stores.
+        inst_id (str): Instrument, e.g. "BTC-USDT".
+        bar (str): Candle interval. Defaults to "5m".
+    """
+
+    def __init__(self, root, inst_id, bar="5m"):
+        self.inst_id = inst_id
+        self.bar = bar
+        self.bar_ms = BAR_MS[bar]
+        self.path = os.path.join(root, inst_id, bar)
+        os.makedirs(self.path, exist_ok=True)
+        self._files = {
+            name: os.path.join(self.path, name)
+            for name in ("timestamps.i8", "values.f8", "confirmed.u1")
+        }
+        for file in self._files.values():
+            if not os.path.exists(file):
+                open(file, "wb").close()
+        self._map()
+
+    def _map(self):
+        size = os.path.getsize(self._files["timestamps.i8"]) // 8
+        # the values file is written last, a crash mid-append leaves no partial rows visible
+        size = min(
+            size, os.path.getsize(self._files["values.f8"]) // (8 * len(COLUMNS))
+        )
+        size = min(size, os.path.getsize(self._files["confirmed.u1"]))
+        self._size = size
+        if size == 0:
+            self.timestamps = np.empty(0, np.int64)
+            self.values = np.empty((0, len(COLUMNS)), np.float64)
+            self.confirmed = np.empty(0, np.uint8)
+            return
+        self.timestamps = np.memmap(
+            self._files["timestamps.i8"], np.int64, "r", shape=(size,)
+        )
+        self.values = np.memmap(
+            self._files["values.f8"], np.float64, "r", shape=(size, len(COLUMNS))
+        )
+        self.confirmed = np.memmap(
+            self._files["confirmed.u1"], np.uint8, "r", shape=(size,)
+        )
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        return int(self.timestamps[-1]) if self._size else None
+
+    def append(self, timestamps, values, confirmed):
+        """
+        Writes bars (ascending) after the stored ones; a bar with the last stored timestamp replaces
+        it in place (an open candle that has since moved or closed), older bars are ignored.
+        """
+        last = self.last_timestamp
+        start = self._size
+        if last is not None:
+            keep = timestamps >= last
+            timestamps, values, confirmed = (
+                timestamps[keep],
+                values[keep],
+                confirmed[keep],
+            )
+            if timestamps.size and timestamps[0] == last:
+                start -= 1
+        if not timestamps.size:
+            return 0
+        for name, array, itemsize in (
+            ("confirmed.u1", np.asarray(confirmed, np.uint8), 1),
+            ("timestamps.i8", np.asarray(timestamps, np.int64), 8),
+            ("values.f8", np.asarray(values, np.float64), 8 * len(COLUMNS)),
+        ):
+            with open(self._files[name], "r+b") as f:
+                f.seek(start * itemsize)
+                f.write(np.ascontiguousarray(array).tobytes())
+                f.truncate()
+        self._map()
+        return self._size - start
+
+    async def sync(self, client, history):
+        """
+        Brings the store up to date through `client` (an `AsyncCandleClient`). An empty store is
+        filled with the latest `history` bars; afterwards only newer bars are requested, at most
+        `history` of them. If those do not reach back to the stored bars, the store is replaced
+        by them rather than paged through to its end or left with a hole.
+
+        Returns:
+            int: Number of bars written.
+        """
+        last = self.last_timestamp
+        if last is None or len(self) < history:
+            # new, or kept for a shorter lookback: start over with the full history
+            self.clear()
+            raw = await client.fetch_raw(self.inst_id, history)
+        else:
+            open_bar = not self.confirmed[-1]
+            since = last - 1 if open_bar else last
+            raw = await client.fetch_raw(self.inst_id, history, since=since)
+        timestamps, values, confirmed = parse_candle_arrays(raw)
+        timestamps = timestamps.astype(np.int64)
+        if (
+            len(timestamps) >= history
+            and len(self)
+            and timestamps.min() > self.last_timestamp + self.bar_ms
+        ):
+            self.clear()  # too far behind, the latest bars do not connect to the store
+        return self.append(timestamps, values, confirmed)
+
+    def rewrite(self, timestamps, values, confirmed):
+        """Replaces the whole store with the given bars (ascending, unique)."""
+        for name, array in (
+            ("confirmed.u1", np.asarray(confirmed, np.uint8)),
+            ("timestamps.i8", np.asarray(timestamps, np.int64)),
+            ("values.f8", np.asarray(values, np.float64)),
+        ):
+            tmp = f"{self._files[name]}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(np.ascontiguousarray(array).tobytes())
+            os.replace(tmp, self._files[name])
+        self._map()
+
+    def clear(self):
+        for file in self._files.values():
+            open(file, "wb").close()
+        self._map()
+
+    def window(self, number):
+        """Views of the last `number` bars: (timestamps int64 ms, values float64 [n, 6])."""
+        return self.timestamps[-number:], self.values[-number:]
+
+    def frame(self, number):
+        """The last `number` bars in the `get_okx_data` DataFrame layout."""
+        timestamps, values = self.window(number)
+        df = pd.DataFrame(np.array(values), columns=COLUMNS)
+        df.insert(0, "timestamps", pd.to_datetime(np.asarray(timestamps), unit="ms"))
+        return df
+
+
+def sync_stores(stores, history, **client_kwargs):
+    """Syncs several stores concurrently over one pooled client; returns the bars written to each."""
+
+    async def run():
+        async with AsyncCandleClient(**client_kwargs) as client:
+            return await asyncio.gather(
+                *(store.sync(client, history) for store in stores)
+            )
+
+    return list(asyncio.run(run()))
@@ -1,12 +1,15 @@
+from itertools import chain
+
+import numpy as np
 import requests
 import pandas as pd
-import time
-from datetime import datetime
 from core.okx.retry import retry
 
 BASE_URL = "https://www.okx.com/api/v5/market/history-candles"
 BAR = "5m"
 LIMIT = 300  # OKX 每次最多 100 条
+COLUMNS = ["timestamps", "open", "high", "low", "close", "volume", "amount"]
+FIELDS = 9  # ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm
 
 
 @retry()
@@ -27,11 +30,12 @@ def fetch_candles(coin: str, after=""):
     return data["data"]
 
 
-def get_okx_data(coin: str, number: int):
+def get_okx_data(coin: str, number: int, confirmed_only: bool = False):
     all_data = []
     before = ""
 
-    while len(all_data) < number:
+    # 只要已收盘的K线时, 最新一根可能未收盘, 多取一根
+    while len(all_data) < number + confirmed_only:
         candles = fetch_candles(coin, before)
         if not candles:
             break
@@ -40,24 +44,63 @@ def get_okx_data(coin: str, number: int):
         before = f"{candles[-1][0]}"
         # time.sleep(0.05)  # 防止请求过快被限流
 
+    df = parse_candles(all_data, confirmed_only)
     # 只保留 TOTAL 条
-    all_data = all_data[:number]
+    return df.iloc[-number:].reset_index(drop=True) if len(df) > number else df
+
 
-    # OKX 返回的数据是按时间倒序，需要翻转
-    all_data.reverse()
+def parse_candle_arrays(all_data: list):
+    """
+    OKX 原始K线 (倒序, 字符串) -> 按时间正序的数组, 一次性向量化解析
 
-    # 解析数据
-    rows = []
-    for one_data in all_data:
-        ts, o, h, l, c, vol, amt, *_ = one_data
-        timestamp = datetime.utcfromtimestamp(int(ts) / 1000).strftime(
-            "%Y-%m-%d %H:%M:%S"
+    Returns:
+        (timestamps datetime64[ms], values float64 [n, 6] open/high/low/close/vol/amount,
+         confirmed bool [n], 未收盘或缺少 confirm 字段的K线为 False); 有空字段的K线被丢弃
+    """
+    if not all_data:
+        return (
+            np.empty(0, "datetime64[ms]"),
+            np.empty((0, len(COLUMNS) - 1)),
+            np.empty(0, bool),
         )
-        rows.append(
-            [timestamp, float(o), float(h), float(l), float(c), float(vol), float(amt)]
+    width = len(all_data[0])
+    table = None
+    if len(set(map(len, all_data))) == 1:
+        # 所有字段拼成一个字符串, 由numpy一次解析成float64 (毫秒时间戳 < 2**53, 无精度损失)
+        try:
+            table = np.fromstring(",".join(chain.from_iterable(all_data)), sep=",")
+        except ValueError:
+            table = None
+        if table is not None and table.size != len(all_data) * width:
+            table = None
+    if table is None:
+        # 有空字段或行长度不一致: 补齐/截断到 FIELDS 个字段, 逐字段转换, 空字段为NaN
+        width = FIELDS
+        table = np.array(
+            [(list(row) + [""] * FIELDS)[:FIELDS] for row in all_data], dtype=object
         )
+        table[table == ""] = "nan"
+        table = table.astype(np.float64)
+    table = table.reshape(len(all_data), width)[::-1]  # OKX 倒序 -> 正序
+    if width < FIELDS:
+        # 字段不足的行与逐字段路径一样补NaN: 缺少 confirm 即视为未收盘
+        table = np.hstack([table, np.full((len(table), FIELDS - width), np.nan)])
+    # 时间戳或价格/成交量缺失的K线不可用 (会让整个预测批次失败), 解析时丢弃
+    valid = ~np.isnan(table[:, :7]).any(axis=1)
+    if not valid.all():
+        table = table[valid]
+
+    timestamps = table[:, 0].astype(np.int64).astype("datetime64[ms]")
+    values = np.ascontiguousarray(table[:, 1:7])
+    confirmed = table[:, 8] == 1
+    return timestamps, values, confirmed
+
 
-    columns = ["timestamps", "open", "high", "low", "close", "volume", "amount"]
-    df = pd.DataFrame(rows, columns=columns)
-    df["timestamps"] = pd.to_datetime(df["timestamps"])
+def parse_candles(all_data: list, confirmed_only: bool = False):
+    """OKX 原始K线 (倒序) -> 按时间正序的 DataFrame, confirmed_only 时去掉未收盘的K线"""
+    timestamps, values, confirmed = parse_candle_arrays(all_data)
+    if confirmed_only:
+        timestamps, values = timestamps[confirmed], values[confirmed]
+    df = pd.DataFrame(values, columns=COLUMNS[1:])
+    df.insert(0, "timestamps", timestamps)
     return df
@@ -0,0 +1,203 @@
+"""
+Local stand-in for the OKX market-data API, for tests and benchmarks of the candle clients.
+
+Serves `/api/v5/market/history-candles` and `/api/v5/market/candles` with deterministic synthetic
+candles: every (instId, timestamp) always gets the same bar, the newest one is still open
+(confirm "0"). Paging follows OKX: results are newest first, `after` returns bars older than the
+given timestamp, `before` newer ones, at most `max_limit` per request. A per-server rate limit
+answers HTTP 429 with code 50011 like the real API, and `latency_s` simulates the network.
+
+    with MockOKXServer(history=10_000) as server:
+        frames = fetch_okx_data(["BTC-USDT"], 256, base_url=server.url)
+
+Run with `python -m core.okx.mock_server [port]` to serve in the foreground.
+"""
+
+import json
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+BAR_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1H": 3_600_000}
+
+
+def _synthetic_close(seed, i):
+    noise = np.sin(i * 12.9898 + seed) * 43758.5453 % 1.0 - 0.5
+    return (100.0 + seed) * np.exp(0.02 * np.sin(i / 288.0) + 0.002 * noise), noise
+
+
+def synthetic_candles(inst_id, stamps):
+    """Raw OKX rows for the bar-open `stamps` (int64 ms), in the given order."""
+    seed = zlib.crc32(inst_id.encode("utf-8")) % 1000
+    i = stamps // 60_000
+    close, noise = _synthetic_close(seed, i)
+    open_, _ = _synthetic_close(seed, i - 1)
+    high = np.maximum(open_, close) * 1.001
+    low = np.minimum(open_, close) * 0.999
+    vol = 10.0 + 5.0 * (noise + 0.5)
+    return [
+        [str(ts), f"{o:.4f}", f"{h:.4f}", f"{l:.4f}", f"{c:.4f}", f"{v:.4f}"]
+        + [f"{v * c:.4f}", f"{v * c:.4f}", "1"]
+        for ts, o, h, l, c, v in zip(stamps.tolist(), open_, high, low, close, vol)
+    ]
+
+
+class MockOKXServer(ThreadingHTTPServer):
+    """
+    Args:
+        port (int): Port on 127.0.0.1, 0 picks a free one.
+        history (int): Bars available per instrument, ending at the current (open) bar.
+        bar (str): Candle interval served.
+        now_ms (int, optional): Open time of the newest bar. Defaults to the current bar.
+        rate (int), per (float): At most `rate` requests per `per` seconds, None: unlimited.
+        max_limit (int): Candles per page at most.
+        latency_s (float): Delay added to every response.
+        error_pages (int): The first `error_pages` requests get an HTML 502 page, as from a gateway.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port=0,
+        history=100_000,
+        bar="5m",
+        now_ms=None,
+        rate=None,
+        per=2.0,
+        max_limit=100,
+        latency_s=0.0,
+        error_pages=0,
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.bar_ms = BAR_MS[bar]
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        self.last_ms = now_ms - now_ms % self.bar_ms
+        self.first_ms = self.last_ms - (history - 1) * self.bar_ms
+        self.rate = rate
+        self.per = per
+        self.max_limit = max_limit
+        self.latency_s = latency_s
+        self.error_pages = error_pages
+        self.requests = 0
+        self.rate_limited = 0
+        self._starts = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(
+                request, client_address
+            )  # clients hanging up are expected
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def admit(self):
+        with self._lock:
+            self.requests += 1
+            if self.rate is None:
+                return True
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] >= self.per:
+                self._starts.popleft()
+            if len(self._starts) >= self.rate:
+                self.rate_limited += 1
+                return False
+            self._starts.append(now)
+            return True
+
+    def candles(self, inst_id, after=None, before=None, limit=100):
+        newest = self.last_ms if after is None else min(self.last_ms, after - 1)
+        newest -= (newest - self.first_ms) % self.bar_ms
+        oldest = self.first_ms if before is None else max(self.first_ms, before + 1)
+        if newest < oldest:
+            return []
+        count = (newest - oldest) // self.bar_ms + 1
+        # newest first; so `before` alone returns the latest bars, not the ones right after it
+        stamps = newest - np.arange(min(limit, count), dtype=np.int64) * self.bar_ms
+        rows = synthetic_candles(inst_id, stamps)
+        if stamps.size and stamps[0] == self.last_ms:
+            rows[0][-1] = "0"  # the current bar is still open
+        return rows
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the real API
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path not in (
+            "/api/v5/market/history-candles",
+            "/api/v5/market/candles",
+        ):
+            return self._reply(404, {"code": "404", "msg": "Not Found", "data": []})
+        if server.latency_s:
+            time.sleep(server.latency_s)
+        if not server.admit():
+            return self._reply(
+                429, {"code": "50011", "msg": "Too Many Requests", "data": []}
+            )
+        with server._lock:
+            error_page = server.error_pages > 0
+            server.error_pages -= error_page
+        if error_page:
+            return self._reply(502, "<html><body>502 Bad Gateway</body></html>")
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            rows = server.candles(
+                query["instId"],
+                after=int(query["after"]) if query.get("after") else None,
+                before=int(query["before"]) if query.get("before") else None,
+                limit=min(int(query.get("limit", 100)), server.max_limit),
+            )
+        except (KeyError, ValueError) as e:
+            return self._reply(
+                400, {"code": "51000", "msg": f"Parameter error: {e}", "data": []}
+            )
+        self._reply(200, {"code": "0", "msg": "", "data": rows})
+
+    def _reply(self, status, body):
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/html"
+        else:
+            payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # quiet, benchmarks make thousands of requests
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8088
+    with MockOKXServer(port=port, rate=20) as server:
+        print(f"[mock-okx] serving on {server.url}")
+        server._thread.join()
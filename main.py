@@ -2,12 +2,12 @@ import math
 from time import sleep
 from core.kronos.main import main_infer
 from core.okx.api_service import APIService
-from core.config import Config
+from core.config import get_config
 
 
 class Machine:
     def __init__(self) -> None:
-        self.config = Config()
+        self.config = get_config()
         self.api = APIService()
         self.target_coins = self.config.target_coins
 
@@ -61,9 +61,9 @@ class Machine:
         for coin in self.target_coins:
             r = infer_results[coin]
             self.log(f"[infer] {coin}: {r[0]}")
-            if r[0] > 0.6:
+            if r[0] > self.config.long_threshold:
                 self.long(coin)
-            elif r[0] < 0.4:
+            elif r[0] < self.config.short_threshold:
                 self.short(coin)
 
 
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from core.kronos.model.kronos import Kronos, KronosPredictor, KronosTokenizer
+
+COLUMNS = ["open", "high", "low", "close", "volume", "amount"]
+
+
+@pytest.fixture
+def make_predictor():
+    """Factory of a small random-weight `KronosPredictor` (same weights on every call)."""
+
+    def make(**kwargs):
+        torch.manual_seed(0)
+        tokenizer = KronosTokenizer(
+            d_in=6,
+            d_model=32,
+            n_heads=4,
+            ff_dim=64,
+            n_enc_layers=2,
+            n_dec_layers=2,
+            ffn_dropout_p=0.0,
+            attn_dropout_p=0.0,
+            resid_dropout_p=0.0,
+            s1_bits=4,
+            s2_bits=4,
+            beta=0.05,
+            gamma0=1.0,
+            gamma=1.1,
+            zeta=0.05,
+            group_size=4,
+        ).eval()
+        model = Kronos(
+            s1_bits=4,
+            s2_bits=4,
+            n_layers=2,
+            d_model=32,
+            n_heads=4,
+            ff_dim=64,
+            ffn_dropout_p=0.0,
+            attn_dropout_p=0.0,
+            resid_dropout_p=0.0,
+            token_dropout_p=0.0,
+            learn_te=True,
+        ).eval()
+        return KronosPredictor(model, tokenizer, max_context=128, **kwargs)
+
+    return make
+
+
+def make_frames(lengths, pred_len=4, seed=0):
+    """Random candle DataFrames of the given lengths, with their (x, y) timestamps."""
+    rng = np.random.default_rng(seed)
+    dfs, x_stamps, y_stamps = [], [], []
+    for length in lengths:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+        dfs.append(
+            pd.DataFrame(
+                {
+                    "open": close,
+                    "high": close * 1.01,
+                    "low": close * 0.99,
+                    "close": close,
+                    "volume": rng.random(length) * 10,
+                    "amount": rng.random(length) * 1000,
+                }
+            )
+        )
+        stamps = pd.Series(
+            pd.date_range("2025-01-01", periods=length + pred_len, freq="5min")
+        )
+        x_stamps.append(stamps[:length].reset_index(drop=True))
+        y_stamps.append(stamps[length:].reset_index(drop=True))
+    return dfs, x_stamps, y_stamps
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from core.okx.async_kline import AsyncCandleClient
+from core.okx.mock_server import MockOKXServer
+
+
+def fetch_page(server, **kwargs):
+    async def run():
+        async with AsyncCandleClient(base_url=server.url, **kwargs) as client:
+            return await client.fetch_page("BTC-USDT"), client.requests
+
+    return asyncio.run(run())
+
+
+def test_error_pages_are_retried():
+    with MockOKXServer(history=500, error_pages=2) as server:
+        page, requests = fetch_page(server, per=0.05)
+    assert len(page) == 100 and requests == 3
+
+
+def test_error_pages_retry_cap():
+    with MockOKXServer(history=500, error_pages=10) as server:
+        with pytest.raises(RuntimeError, match="HTTP 502"):
+            fetch_page(server, per=0.05, rate_limit_retries=2)
+        assert server.requests == 3
+
+
+BAR_MS = 300_000
+NOW_MS = 1_735_776_000_000  # 2025-01-02 00:00 UTC
+
+
+def fetch_raw(server, *args, client_kwargs=None, **kwargs):
+    async def run():
+        async with AsyncCandleClient(
+            base_url=server.url, **(client_kwargs or {})
+        ) as client:
+            return await client.fetch_raw("BTC-USDT", *args, **kwargs), client.requests
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def server():
+    with MockOKXServer(history=1000, now_ms=NOW_MS) as srv:
+        yield srv
+
+
+def test_fetch_raw_pages_backwards(server):
+    raw, requests = fetch_raw(server, 250)
+    stamps = [int(r[0]) for r in raw]
+    assert requests == 3
+    assert stamps[0] == NOW_MS and stamps == list(
+        range(NOW_MS, NOW_MS - 250 * BAR_MS, -BAR_MS)
+    )
+    assert raw[0][-1] == "0" and raw[1][-1] == "1"
+
+
+def test_fetch_raw_since_and_until(server):
+    raw, requests = fetch_raw(server, None, since=NOW_MS - 5 * BAR_MS)
+    assert requests == 1 and [int(r[0]) for r in raw] == [
+        NOW_MS - i * BAR_MS for i in range(5)
+    ]
+    raw, _ = fetch_raw(server, 10, until=NOW_MS - 100 * BAR_MS)
+    assert int(raw[0][0]) == NOW_MS - 101 * BAR_MS and len(raw) == 10
+
+
+def test_fetch_raw_stops_at_history(server):
+    raw, _ = fetch_raw(server, 5000)
+    assert len(raw) == 1000
+
+
+def test_fetch_many_keeps_order(server):
+    async def run():
+        async with AsyncCandleClient(base_url=server.url) as client:
+            return await client.fetch_many(["ETH-USDT", "BTC-USDT"], 150)
+
+    eth, btc = asyncio.run(run())
+    assert len(eth) == len(btc) == 150
+    assert eth["timestamps"].is_monotonic_increasing
+    assert (eth["close"] != btc["close"]).all()
+
+
+def test_rate_limit_is_retried():
+    with MockOKXServer(history=500, rate=1, per=0.3) as server:
+        raw, requests = fetch_raw(server, 200, client_kwargs={"per": 0.1})
+        assert len(raw) == 200 and server.rate_limited > 0
+        assert requests == 2 + server.rate_limited
+
+
+def test_rate_limit_retry_cap():
+    with MockOKXServer(history=500, rate=1, per=60) as server:
+        with pytest.raises(RuntimeError, match="Still rate limited"):
+            fetch_raw(server, 200, client_kwargs={"per": 0.05, "rate_limit_retries": 3})
+        assert server.rate_limited == 4
@@ -0,0 +1,138 @@
+import pytest
+import torch
+
+from core.kronos.model.module import (
+    MultiHeadAttentionWithRoPE,
+    MultiHeadCrossAttentionWithRoPE,
+    get_attention_backend,
+    set_attention_backend,
+)
+
+D_MODEL, N_HEADS = 32, 4
+ATOL = RTOL = 1e-5
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    backend = get_attention_backend()
+    yield
+    set_attention_backend(backend)
+
+
+def run(backend, fn):
+    set_attention_backend(backend)
+    with torch.no_grad():
+        return fn()
+
+
+def assert_parity(fn):
+    """Runs `fn` with both backends and compares the outputs."""
+    expected = run("math", fn)
+    actual = run("sdpa", fn)
+    torch.testing.assert_close(actual, expected, atol=ATOL, rtol=RTOL)
+    assert not torch.isnan(actual).any()
+
+
+def padding_masks(batch_size, seq_len, pad_lens):
+    """Bool and float key padding masks for left-padded series."""
+    mask = torch.zeros(batch_size, seq_len, dtype=torch.bool)
+    for row, pad in enumerate(pad_lens):
+        mask[row, :pad] = True
+    float_mask = torch.zeros(batch_size, seq_len).masked_fill(mask, float("-inf"))
+    return {"bool": mask, "float": float_mask}
+
+
+@pytest.fixture
+def self_attn():
+    torch.manual_seed(0)
+    return MultiHeadAttentionWithRoPE(D_MODEL, N_HEADS).eval()
+
+
+@pytest.fixture
+def cross_attn():
+    torch.manual_seed(0)
+    return MultiHeadCrossAttentionWithRoPE(D_MODEL, N_HEADS).eval()
+
+
+def test_self_attention_causal_full_length(self_attn):
+    x = torch.randn(3, 12, D_MODEL)
+    assert_parity(lambda: self_attn(x))
+
+
+@pytest.mark.parametrize("mask_kind", ["bool", "float"])
+def test_self_attention_left_padded(self_attn, mask_kind):
+    x = torch.randn(3, 12, D_MODEL)
+    mask = padding_masks(3, 12, [0, 4, 11])[mask_kind]
+    assert_parity(lambda: self_attn(x, key_padding_mask=mask))
+
+
+@pytest.mark.parametrize("mask_kind", [None, "bool", "float"])
+def test_self_attention_kv_cache(self_attn, mask_kind):
+    """Prefill, an offset-causal chunk (q_len < kv_len) and a single-query decode step."""
+    x = torch.randn(3, 12, D_MODEL)
+    masks = padding_masks(3, 12, [0, 2, 5])
+
+    def decode():
+        self_attn.reset_cache()
+        outputs = []
+        for start, end in [(0, 8), (8, 11), (11, 12)]:
+            mask = None if mask_kind is None else masks[mask_kind][:, :end]
+            outputs.append(
+                self_attn(x[:, start:end], key_padding_mask=mask, use_cache=True)
+            )
+        return torch.cat(outputs, dim=1)
+
+    assert_parity(decode)
+    # cached decoding matches the full-length forward
+    mask = None if mask_kind is None else masks[mask_kind]
+    for backend in ("sdpa", "math"):
+        full = run(backend, lambda: self_attn(x, key_padding_mask=mask))
+        valid = ~masks["bool"] if mask_kind else torch.ones(3, 12, dtype=torch.bool)
+        torch.testing.assert_close(
+            run(backend, decode)[valid], full[valid], atol=ATOL, rtol=RTOL
+        )
+
+
+@pytest.mark.parametrize("mask_kind", [None, "bool", "float"])
+def test_cross_attention(cross_attn, mask_kind):
+    query = torch.randn(3, 12, D_MODEL)
+    context = torch.randn(3, 12, D_MODEL)
+    mask = None if mask_kind is None else padding_masks(3, 12, [0, 4, 11])[mask_kind]
+    assert_parity(lambda: cross_attn(query, context, context, key_padding_mask=mask))
+
+
+@pytest.mark.parametrize("mask_kind", [None, "bool", "float"])
+def test_cross_attention_causal(cross_attn, mask_kind):
+    """The training-mode cross attention is causal; dropout is zero so it is deterministic."""
+    query = torch.randn(3, 12, D_MODEL)
+    context = torch.randn(3, 12, D_MODEL)
+    mask = None if mask_kind is None else padding_masks(3, 12, [0, 4, 11])[mask_kind]
+    cross_attn.train()
+    assert_parity(lambda: cross_attn(query, context, context, key_padding_mask=mask))
+
+
+@pytest.mark.parametrize("mask_kind", [None, "bool", "float"])
+def test_cross_attention_kv_cache(cross_attn, mask_kind):
+    """Single-query decode steps over a growing cached context."""
+    query = torch.randn(3, 1, D_MODEL)
+    context = torch.randn(3, 12, D_MODEL)
+    masks = padding_masks(3, 12, [0, 2, 5])
+
+    def decode():
+        cross_attn.reset_cache()
+        cross_attn.extend_cache(context[:, :8], context[:, :8])
+        outputs = []
+        for start, end in [(8, 9), (9, 12)]:
+            mask = None if mask_kind is None else masks[mask_kind][:, :end]
+            outputs.append(
+                cross_attn(
+                    query,
+                    context[:, start:end],
+                    context[:, start:end],
+                    key_padding_mask=mask,
+                    use_cache=True,
+                )
+            )
+        return torch.cat(outputs, dim=1)
+
+    assert_parity(decode)
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.okx.async_kline import AsyncCandleClient
+from core.okx.bulk_download import BulkDownloader, find_gaps, merge_candles
+from core.okx.candle_store import CandleStore
+from core.okx.mock_server import MockOKXServer
+
+BAR_MS = 300_000
+NOW = pd.Timestamp("2025-01-02", tz="UTC")
+NOW_MS = NOW.value // 1_000_000
+
+
+@pytest.fixture
+def server():
+    with MockOKXServer(history=2000, now_ms=NOW_MS) as srv:
+        yield srv
+
+
+@pytest.mark.parametrize("end", ["2025-01-01", "2024-12-31"])
+def test_empty_range_is_rejected(tmp_path, server, end):
+    downloader = BulkDownloader(str(tmp_path), base_url=server.url)
+    with pytest.raises(ValueError, match="Empty download range"):
+        downloader.download("BTC-USDT", "2025-01-01", end)
+
+
+def test_range_without_bar_open_keeps_store(tmp_path, server):
+    downloader = BulkDownloader(str(tmp_path), base_url=server.url)
+    downloader.download("BTC-USDT", "2025-01-01 00:00", "2025-01-01 01:00")
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    before = np.array(store.timestamps)
+
+    # no bar opens in [00:01, 00:04)
+    report = downloader.download("BTC-USDT", "2025-01-01 00:01", "2025-01-01 00:04")
+    assert report["slices"] == 0 and report["gaps"] == []
+    np.testing.assert_array_equal(
+        CandleStore(str(tmp_path), "BTC-USDT").timestamps, before
+    )
+
+
+def test_find_gaps_inside_and_at_the_edges():
+    stamps = np.array([2, 3, 6, 7]) * BAR_MS
+    assert find_gaps(stamps, BAR_MS) == [(4 * BAR_MS, 5 * BAR_MS, 2)]
+    assert find_gaps(stamps, BAR_MS, 0, 10 * BAR_MS) == [
+        (0, BAR_MS, 2),
+        (4 * BAR_MS, 5 * BAR_MS, 2),
+        (8 * BAR_MS, 9 * BAR_MS, 2),
+    ]
+    # bars outside the range are not looked at, an unaligned start counts from the next bar
+    assert find_gaps(stamps, BAR_MS, 2 * BAR_MS + 1, 4 * BAR_MS) == []
+    assert find_gaps(np.array([], np.int64), BAR_MS, 0, 3 * BAR_MS) == [
+        (0, 2 * BAR_MS, 3)
+    ]
+
+
+def test_merge_candles_later_part_wins():
+    first = (np.array([1, 2, 3]), np.full((3, 6), 1.0), np.ones(3, np.uint8))
+    second = (np.array([3, 4]), np.full((2, 6), 2.0), np.zeros(2, np.uint8))
+    timestamps, values, confirmed, duplicates = merge_candles(first, second)
+    assert timestamps.tolist() == [1, 2, 3, 4] and duplicates == 1
+    assert values[:, 0].tolist() == [1, 1, 2, 2]
+    assert confirmed.tolist() == [1, 1, 0, 0]
+
+
+def test_download_fills_range(tmp_path, server):
+    downloader = BulkDownloader(str(tmp_path), slice_bars=100, base_url=server.url)
+    report = downloader.download("BTC-USDT", "2025-01-01", "2025-01-01 12:00")
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    assert report["slices"] == 2 and report["bars"] == 144 == len(store)
+    assert report["gaps"] == [] and report["duplicates"] == 0
+    assert store.timestamps[0] == NOW_MS - 24 * 3600_000
+    np.testing.assert_array_equal(np.diff(store.timestamps), BAR_MS)
+    assert not os.listdir(os.path.join(store.path, "download"))
+
+
+def test_download_reports_missing_edges(tmp_path):
+    # the server only has the bars from 06:05 until 11:00
+    with MockOKXServer(history=60, now_ms=NOW_MS - 13 * 3600_000) as server:
+        downloader = BulkDownloader(str(tmp_path), base_url=server.url)
+        report = downloader.download("BTC-USDT", "2025-01-01", "2025-01-01 12:00")
+    assert report["bars"] == 60
+    assert [g[2] for g in report["gaps"]] == [73, 11]
+    assert report["missing_bars"] == 84 and report["store_gaps"] == []
+
+
+def test_interrupted_download_resumes(tmp_path, server, monkeypatch):
+    fetch_raw = AsyncCandleClient.fetch_raw
+    calls = []
+
+    async def failing_fetch_raw(self, *args, **kwargs):
+        calls.append(kwargs["until"])
+        if len(calls) == 3:
+            raise ConnectionError("network down")
+        return await fetch_raw(self, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncCandleClient, "fetch_raw", failing_fetch_raw)
+    downloader = BulkDownloader(
+        str(tmp_path), slice_bars=50, concurrency=1, base_url=server.url
+    )
+    with pytest.raises(ConnectionError):
+        downloader.download("BTC-USDT", "2025-01-01", "2025-01-01 12:00")
+    assert len(CandleStore(str(tmp_path), "BTC-USDT")) == 0
+
+    monkeypatch.setattr(AsyncCandleClient, "fetch_raw", fetch_raw)
+    report = downloader.download("BTC-USDT", "2025-01-01", "2025-01-01 12:00")
+    assert report["slices"] == 3 and report["resumed_slices"] == 2
+    assert report["bars"] == 44 and report["stored_bars"] == 144
+    assert report["gaps"] == []
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from core.kronos.infer.cache import PredictionCache, prediction_key
+
+
+def test_key_covers_contents_dtype_and_params():
+    a = np.arange(6, dtype=np.float32).reshape(2, 3)
+    key = prediction_key([a, None], {"seed": 1})
+    assert key == prediction_key([a.copy(), None], {"seed": 1})
+    assert key != prediction_key([a.astype(np.float64), None], {"seed": 1})
+    assert key != prediction_key([a.reshape(3, 2), None], {"seed": 1})
+    assert key != prediction_key([a, None], {"seed": 2})
+    assert key != prediction_key([a, None], {"seed": 1}, namespace="other")
+
+
+def test_memory_tier_is_lru():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", np.zeros(1))
+    cache.put("b", np.ones(1))
+    assert cache.get("a")[0]  # "b" is now the least recently used
+    cache.put("c", np.full(1, 2.0))
+    assert not cache.get("b")[0]
+    assert cache.get("a")[0] and cache.get("c")[0]
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_get_or_compute_returns_copies():
+    cache = PredictionCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(3.0)
+
+    first = cache.get_or_compute([np.ones(2)], {}, compute)
+    first[:] = -1
+    second = cache.get_or_compute([np.ones(2)], {}, compute)
+    assert len(calls) == 1 and second.tolist() == [0, 1, 2]
+
+
+def test_disk_tier_round_trip(tmp_path):
+    value = np.random.default_rng(0).random((2, 3, 4)).astype(np.float32)
+    PredictionCache(disk_dir=str(tmp_path)).put("k", value)
+    assert os.listdir(tmp_path) == ["k.npz"]
+
+    cache = PredictionCache(disk_dir=str(tmp_path))  # e.g. after a restart
+    found, loaded = cache.get("k")
+    assert found and loaded.dtype == np.float32
+    np.testing.assert_array_equal(loaded, value)
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_ignores_foreign_files(tmp_path):
+    (tmp_path / "bad.npz").write_bytes(b"not a zip")
+    np.savez(tmp_path / "pickled.npz", value=np.array([{"a": 1}], dtype=object))
+    cache = PredictionCache(disk_dir=str(tmp_path))
+    assert not cache.get("bad")[0]
+    assert not cache.get("pickled")[0]  # object arrays would need unpickling
+    assert cache.stats()["misses"] == 2
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    entry = np.zeros(2**14)  # 128 KiB
+    cache = PredictionCache(max_entries=1, disk_dir=str(tmp_path), max_disk_mb=0.5)
+    for i in range(10):
+        cache.put(f"k{i}", entry)
+        os.utime(tmp_path / f"k{i}.npz", (i, i))  # distinct, ordered times
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["k7.npz", "k8.npz", "k9.npz"]
+    assert cache.stats()["disk_evictions"] == 7
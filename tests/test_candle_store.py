@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from core.okx.candle_buffer import CandleRingBuffer, MarketDataCache
+from core.okx.candle_store import CandleStore, sync_stores
+from core.okx.mock_server import MockOKXServer
+
+BAR_MS = 300_000
+NOW_MS = 1_735_776_000_000  # 2025-01-02 00:00 UTC
+HISTORY = 256
+
+
+@pytest.fixture
+def server():
+    with MockOKXServer(history=5000, now_ms=NOW_MS) as srv:
+        yield srv
+
+
+def sync(server, store):
+    (written,) = sync_stores([store], HISTORY, base_url=server.url)
+    return written
+
+
+def test_sync_fills_empty_store(tmp_path, server):
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    assert sync(server, store) == HISTORY
+    assert store.last_timestamp == NOW_MS
+    np.testing.assert_array_equal(np.diff(store.timestamps), BAR_MS)
+    assert store.confirmed[-1] == 0 and store.confirmed[:-1].all()
+    assert server.requests == 3
+
+
+def test_sync_fetches_only_new_bars(tmp_path, server):
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    sync(server, store)
+    server.last_ms += 3 * BAR_MS
+    requests = server.requests
+
+    # the open bar is refetched and replaced, three new ones are appended
+    assert sync(server, store) == 4
+    assert server.requests == requests + 1
+    assert len(store) == HISTORY + 3 and store.last_timestamp == server.last_ms
+    np.testing.assert_array_equal(np.diff(store.timestamps), BAR_MS)
+    assert store.confirmed[-5:].tolist() == [1, 1, 1, 1, 0]
+
+    # it survives a restart
+    reopened = CandleStore(str(tmp_path), "BTC-USDT")
+    np.testing.assert_array_equal(reopened.values, store.values)
+    assert sync(server, reopened) == 1  # only the open bar
+
+
+def test_sync_restarts_store_that_fell_behind(tmp_path, server):
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    sync(server, store)
+    server.last_ms += 2 * HISTORY * BAR_MS
+    requests = server.requests
+
+    assert sync(server, store) == HISTORY
+    assert server.requests - requests == 3  # bounded to `history` bars
+    assert len(store) == HISTORY and store.last_timestamp == server.last_ms
+    np.testing.assert_array_equal(np.diff(store.timestamps), BAR_MS)
+
+
+def test_market_data_cache_follows_store(tmp_path, server):
+    store = CandleStore(str(tmp_path), "BTC-USDT")
+    cache = MarketDataCache(capacity=64)
+    cache.update_from_store(store, sync(server, store))
+    server.last_ms += 2 * BAR_MS
+    cache.update_from_store(store, sync(server, store))
+
+    (values,), (timestamps,) = cache.windows(["BTC-USDT"], 64)
+    np.testing.assert_array_equal(timestamps, store.timestamps[-64:])
+    np.testing.assert_allclose(values, store.values[-64:], rtol=1e-6)
+
+
+def candles(start, n):
+    timestamps = np.arange(start, start + n, dtype=np.int64) * BAR_MS
+    values = np.repeat(np.arange(start, start + n, dtype=np.float32)[:, None], 6, 1)
+    return timestamps, values
+
+
+def test_ring_buffer_wraps_around():
+    buffer = CandleRingBuffer(8)
+    assert buffer.update(*candles(0, 5)) == 5
+    assert buffer.update(*candles(4, 7)) == 7  # replaces bar 4, appends 5..10
+    timestamps, values = buffer.window()
+    assert len(buffer) == 8 and buffer.last_timestamp == 10 * BAR_MS
+    np.testing.assert_array_equal(timestamps, np.arange(3, 11) * BAR_MS)
+    np.testing.assert_array_equal(values[:, 3], np.arange(3, 11))
+    assert timestamps.base is not None  # a view, not a copy
+
+    timestamps, values = buffer.window(3)
+    np.testing.assert_array_equal(timestamps, np.arange(8, 11) * BAR_MS)
+
+
+def test_ring_buffer_ignores_old_rows_and_keeps_capacity():
+    buffer = CandleRingBuffer(4)
+    buffer.update(*candles(10, 2))
+    assert buffer.update(*candles(0, 5)) == 0
+    assert (
+        buffer.update(*candles(11, 20)) == 1 + 4
+    )  # only the last `capacity` are written
+    timestamps, _ = buffer.window(10)
+    np.testing.assert_array_equal(timestamps, np.arange(27, 31) * BAR_MS)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from conftest import make_frames
+from core.kronos.infer.adaptive import adaptive_distribution
+from core.kronos.infer.infer import future_timestamps, window_seeds
+
+
+def test_window_seeds_change_with_every_bar():
+    dfs, xs, _ = make_frames([40, 40])
+    seeds = window_seeds(42, dfs, xs, ["BTC", "ETH"])
+    assert seeds[0] != seeds[1]
+    np.testing.assert_array_equal(seeds, window_seeds(42, dfs, xs, ["BTC", "ETH"]))
+    assert not np.array_equal(seeds, window_seeds(43, dfs, xs, ["BTC", "ETH"]))
+
+    # one bar later
+    later, later_xs, _ = make_frames([41, 41])
+    later_seeds = window_seeds(42, later, later_xs, ["BTC", "ETH"])
+    assert not np.isin(later_seeds, seeds).any()
+
+
+def test_window_seeds_without_keys():
+    dfs, xs, _ = make_frames([40, 40])
+    seeds = window_seeds(42, dfs, xs)
+    assert seeds[0] != seeds[1]  # told apart by their last close
+    values = [df.to_numpy() for df in dfs]
+    stamps = [x.to_numpy().astype("datetime64[ms]").astype(np.int64) for x in xs]
+    np.testing.assert_array_equal(window_seeds(42, values, stamps), seeds)
+
+
+def test_adaptive_distribution_with_window_seeds(make_predictor):
+    predictor = make_predictor()
+    dfs, xs, _ = make_frames([32, 32, 32])
+    ys = future_timestamps(xs, 4)
+    seeds = window_seeds(42, dfs, xs)
+    kwargs = dict(round_size=2, max_samples=6, seed=seeds)
+    first = adaptive_distribution(predictor, dfs, xs, ys, 4, **kwargs)
+    second = adaptive_distribution(predictor, dfs, xs, ys, 4, **kwargs)
+    np.testing.assert_array_equal(first["prob_up"], second["prob_up"])
+    assert ((first["samples"] >= 2) & (first["samples"] <= 6)).all()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from core.okx.kline import parse_candle_arrays, parse_candles
+
+
+def row(ts, confirm="1", fields=9):
+    full = [str(ts), "1.0", "2.0", "0.5", "1.5", "10", "15", "15", confirm]
+    return full[:fields]
+
+
+def test_parses_newest_first_pages_ascending():
+    timestamps, values, confirmed = parse_candle_arrays(
+        [row(3000, "0"), row(2000), row(1000)]
+    )
+    assert timestamps.astype(np.int64).tolist() == [1000, 2000, 3000]
+    assert values.shape == (3, 6) and values[0].tolist() == [1, 2, 0.5, 1.5, 10, 15]
+    assert confirmed.tolist() == [True, True, False]
+
+
+@pytest.mark.parametrize("fields", [7, 8])
+def test_missing_confirm_is_open_on_both_paths(fields):
+    uniform = parse_candle_arrays([row(2000, fields=fields), row(1000, fields=fields)])
+    ragged = parse_candle_arrays([row(2000, fields=fields), row(1000)])
+    assert uniform[2].tolist() == [False, False]
+    assert ragged[2].tolist() == [True, False]
+
+
+def test_ragged_rows_are_padded_or_truncated():
+    long_row = row(2000) + ["extra"]
+    timestamps, values, _ = parse_candle_arrays([long_row, row(1000, fields=7)])
+    assert timestamps.astype(np.int64).tolist() == [1000, 2000]
+    np.testing.assert_array_equal(values[0], values[1])
+
+
+def test_rows_with_empty_or_missing_fields_are_dropped():
+    empty = row(2000)
+    empty[4] = ""
+    short = row(3000, fields=5)
+    timestamps, values, _ = parse_candle_arrays([short, empty, row(1000)])
+    assert timestamps.astype(np.int64).tolist() == [1000]
+    assert not np.isnan(values).any()
+
+
+def test_confirmed_only_frame():
+    df = parse_candles([row(2000, "0"), row(1000)], confirmed_only=True)
+    assert len(df) == 1 and df["timestamps"].iloc[0].value // 1_000_000 == 1000
+    assert parse_candle_arrays([])[1].shape == (0, 6)
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+import torch
+
+from conftest import make_frames
+from core.kronos.infer.cache import PredictionCache
+
+PRED_LEN = 4
+
+
+def test_distribution_rejects_per_series_sample_count(make_predictor):
+    predictor = make_predictor()
+    dfs, xs, ys = make_frames([24, 24], PRED_LEN)
+    with pytest.raises(ValueError, match="single sample_count"):
+        predictor.predict_distribution(dfs, xs, ys, PRED_LEN, sample_count=[2, 4])
+
+
+def test_distribution_summarizes_paths(make_predictor):
+    predictor = make_predictor()
+    dfs, xs, ys = make_frames([24, 24], PRED_LEN)
+    dist = predictor.predict_distribution(
+        dfs, xs, ys, PRED_LEN, sample_count=4, last_step_only=True, seed=1
+    )
+    final_close = dist["paths"][:, :, -1, 3]
+    assert dist["paths"].shape == (2, 4, 1, 6)
+    np.testing.assert_allclose(
+        dist["prob_up"], np.mean(final_close > dist["last_close"][:, None], axis=1)
+    )
+
+
+def assert_paths_close(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_cached_decoding_matches_full_recompute(make_predictor):
+    model = make_predictor().model
+    generator = torch.Generator().manual_seed(0)
+    s1 = torch.randint(0, 16, (2, 20), generator=generator)
+    s2 = torch.randint(0, 16, (2, 20), generator=generator)
+    prompt = 12
+    with torch.no_grad():
+        s1_logits, context = model.prefill(s1[:, :prompt], s2[:, :prompt])
+        for pos in range(prompt, 20):
+            full_logits, full_context = model.decode_s1(s1[:, :pos], s2[:, :pos])
+            torch.testing.assert_close(s1_logits[:, -1], full_logits[:, -1])
+            # s2 of the next position, conditioned on its s1 token
+            sampled = s1[:, pos : pos + 1]
+            torch.testing.assert_close(
+                model.decode_s2(context, sampled, use_cache=True)[:, -1],
+                model.decode_s2(full_context, sampled)[:, -1],
+            )
+            s1_logits, context = model.decode_s1(
+                s1[:, pos : pos + 1], s2[:, pos : pos + 1], use_cache=True
+            )
+
+
+def test_left_padded_batch_matches_solo_runs(make_predictor):
+    predictor = make_predictor()
+    dfs, xs, ys = make_frames([24, 40, 32], PRED_LEN)
+    seeds = [11, 22, 33]
+    batch = predictor.predict_paths(dfs, xs, ys, PRED_LEN, sample_count=3, seed=seeds)
+    for i in range(3):
+        solo = predictor.predict_paths(
+            [dfs[i]], [xs[i]], [ys[i]], PRED_LEN, sample_count=3, seed=[seeds[i]]
+        )
+        assert_paths_close(batch[i], solo[0])
+
+
+def test_per_series_sample_counts_match_solo_runs(make_predictor):
+    predictor = make_predictor()
+    dfs, xs, ys = make_frames([24, 40], PRED_LEN)
+    paths = predictor.predict_paths(
+        dfs, xs, ys, PRED_LEN, sample_count=[2, 5], seed=[1, 2]
+    )
+    assert paths.shape == (7, PRED_LEN, 6)
+    for rows, i, count in ((slice(0, 2), 0, 2), (slice(2, 7), 1, 5)):
+        solo = predictor.predict_paths(
+            [dfs[i]], [xs[i]], [ys[i]], PRED_LEN, sample_count=count, seed=[i + 1]
+        )
+        assert_paths_close(paths[rows], solo[0])
+
+
+def test_warm_start_matches_cold_start(make_predictor):
+    dfs, xs, ys = make_frames([40], PRED_LEN)
+    cold = make_predictor().predict_paths(dfs, xs, ys, PRED_LEN, seed=[5])
+
+    predictor = make_predictor(norm_anchor="anchored")
+    predictor.predict_paths(dfs, xs, ys, PRED_LEN, series_keys=["BTC"], seed=[7])
+    assert len(predictor.prefix_states["BTC"]) == 40
+    # the same window again: only its last bar runs through the model
+    warm = predictor.predict_paths(dfs, xs, ys, PRED_LEN, series_keys=["BTC"], seed=[5])
+    assert_paths_close(warm, cold)
+
+
+def test_warm_start_continues_anchored_prompt(make_predictor):
+    (df,), (x_stamp,), (y_stamp,) = make_frames([44], PRED_LEN)
+    predictor = make_predictor(norm_anchor="anchored")
+    predictor.predict_paths(
+        [df[:40]], [x_stamp[:40]], [x_stamp[40:44]], PRED_LEN, series_keys=["BTC"]
+    )
+    state = predictor.prefix_states["BTC"]
+    warm = predictor.predict_paths(
+        [df], [x_stamp], [y_stamp], PRED_LEN, series_keys=["BTC"], seed=[5]
+    )
+    assert len(predictor.prefix_states["BTC"]) == 44
+
+    # cold: the whole prompt since the anchor, normalized with the anchor statistics
+    (x,), (x_stamps,), (y_stamps,) = predictor._load_series(
+        [df], [x_stamp], [y_stamp], PRED_LEN
+    )
+    paths = make_predictor().generate(
+        predictor._normalize(x, state.mean, state.std)[None],
+        x_stamps[None],
+        y_stamps[None],
+        PRED_LEN,
+        1.0,
+        0,
+        0.9,
+        8,
+        False,
+        average=False,
+        seed=[5],
+    )
+    assert_paths_close(warm[0], paths[0] * (state.std + 1e-5) + state.mean)
+
+
+def test_seeded_predictions_come_from_the_cache(make_predictor, tmp_path):
+    predictor = make_predictor()
+    predictor.prediction_cache = PredictionCache(disk_dir=str(tmp_path))
+    dfs, xs, ys = make_frames([24, 32], PRED_LEN)
+    first = predictor.predict_paths(dfs, xs, ys, PRED_LEN, sample_count=2, seed=3)
+    second = predictor.predict_paths(dfs, xs, ys, PRED_LEN, sample_count=2, seed=3)
+    np.testing.assert_array_equal(first, second)
+    stats = predictor.prediction_cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.kronos.infer.server import (
+    COLUMNS,
+    PredictionClient,
+    PredictionServer,
+    RequestBatcher,
+    decode_request,
+    decode_response,
+    encode_request,
+    encode_response,
+)
+
+
+def series(n):
+    values = np.random.default_rng(n).random((n, 6))
+    stamps = pd.Series(pd.date_range("2025-01-01", periods=n, freq="5min"))
+    return values, stamps
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Daemon whose predictions answer (seq_len, call number) per series, the first call slowly."""
+    calls = []
+
+    def predict_fn(dfs, tps, pred_len, sample_count):
+        calls.append(len(dfs))
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return [[len(df), len(calls)] for df in dfs]
+
+    path = str(tmp_path / "infer.sock")
+    srv = PredictionServer(path, RequestBatcher(predict_fn, window_s=0.0))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_timeout_does_not_leak_late_response(server):
+    client = PredictionClient(server, timeout=0.2)
+    a, ta = series(10)
+    b, tb = series(20)
+    with pytest.raises(TimeoutError):
+        client.predict([a], [ta])
+    time.sleep(0.5)  # the slow answer is sent by now
+    assert client.predict([b], [tb]) == [[20.0, 2.0]]
+    client.close()
+
+
+def test_connection_kept_between_calls(server):
+    with PredictionClient(server, timeout=5.0) as client:
+        a, ta = series(10)
+        client.predict([a], [ta])
+        sock = client._sock
+        b, tb = series(20)
+        assert client.predict([b, a], [tb, ta]) == [[20.0, 2.0], [10.0, 2.0]]
+        assert client._sock is sock
+
+
+def test_request_round_trip():
+    a, ta = series(10)
+    b, tb = series(3)
+    frame = pd.DataFrame(b, columns=COLUMNS)
+    dfs, tps, pred_len, sample_count = decode_request(
+        encode_request([a, frame], [ta, tb], pred_len=12, sample_count=16)
+    )
+    assert (pred_len, sample_count) == (12, 16)
+    np.testing.assert_array_equal(dfs[0].to_numpy(), a)  # float64, bit for bit
+    np.testing.assert_array_equal(dfs[1][COLUMNS].to_numpy(), b)
+    pd.testing.assert_series_equal(tps[1], tb.astype("datetime64[ms]"))
+
+
+def test_response_round_trip():
+    rows = [[0.25, -0.001], [0.75, 0.002]]
+    assert decode_response(encode_response(rows)) == rows
+    with pytest.raises(RuntimeError, match="ValueError: bad window"):
+        decode_response(encode_response(error="ValueError: bad window"))
+
+
+def test_unknown_magic_is_rejected():
+    a, ta = series(4)
+    with pytest.raises(ValueError, match="Unknown request magic"):
+        decode_request(b"KRQ1" + encode_request([a], [ta])[4:])
+    with pytest.raises(ValueError, match="Unknown response magic"):
+        decode_response(b"XXXX" + encode_response([[0.5, 0.0]])[4:])